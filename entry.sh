@@ -16,10 +16,19 @@ elif [ "$2" = "stop" ]; then
 	GDB="./gdb_script/stop_rover.py"
 elif [ "$2" = "tip" ]; then
 	GDB="./gdb_script/tip_over.py"
+elif [ -f "./gdb_script/scenarios/$2.json" ]; then
+	# Any other CPV described by a scenario spec runs on the shared scenario runtime.
+	GDB="./gdb_script/scenario.py"
+	export SWAB_SCENARIO="$2"
 else
 	echo "No CPV provided"
 	exit 1;
 fi
 
-$START /app/firmwareM4_executable.elf $GDB
+if [ -n "$3" ] && [ "$3" != "lockstep" ] && [ "$3" != "realtime" ]; then
+	echo "Unknown timing $3, use lockstep or realtime"
+	exit 1;
+fi
+
+$START /app/firmwareM4_executable.elf $GDB $3
 
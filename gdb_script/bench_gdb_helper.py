@@ -0,0 +1,81 @@
+"""
+Micro-benchmark of gdb_helper register and memory access.
+
+Times the writes LoopBreakpoint.stop makes on every firmware loop iteration (LR, xPSR and the
+autodrive/check position/update compass flags) three ways: formatted `set` commands through
+gdb.execute, the gdb_helper functions one by one, and a gdb_helper.Batch. Run it against a halted
+qemu like the CPV scripts:
+
+    gdb -nw -q -x gdb_script/bench_gdb_helper.py firmwareM4_executable.elf
+
+BENCH_ITERATIONS sets the number of iterations (default 1000). The registers and flags it
+touches are restored afterwards, and gdb quits when done.
+"""
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(__file__))
+import gdb
+from gdb_helper import *
+
+ITERATIONS = int(os.environ.get("BENCH_ITERATIONS", "1000"))
+FLAGS = (0x20000514, 0x200003fd, 0x200003fe)
+LOOP_ADDRESS = 0x46f0
+
+
+def with_commands():
+    gdb.execute(f"set ${Register.LR.value} = {LOOP_ADDRESS}")
+    gdb.execute(f"set ${Register.XPSR.value} = {0x41000000}")
+    for address in FLAGS:
+        gdb.execute(f"set *(unsigned char *){address} = 1")
+    return int(gdb.parse_and_eval(f"${Register.R15.value}"))
+
+
+def with_helpers():
+    set_register(Register.LR, LOOP_ADDRESS)
+    set_register(Register.XPSR, 0x41000000)
+    for address in FLAGS:
+        set_byte(address, 1)
+    return get_register(Register.R15)
+
+
+def with_batch():
+    with Batch() as batch:
+        batch.set_register(Register.LR, LOOP_ADDRESS)
+        batch.set_register(Register.XPSR, 0x41000000)
+        for address in FLAGS:
+            batch.set_byte(address, 1)
+    return get_register(Register.R15)
+
+
+def measure(name, func):
+    func()
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"{name:>10}: {elapsed / ITERATIONS * 1e6:9.1f} us per iteration")
+    return elapsed
+
+
+def main():
+    saved_registers = {reg: get_register(reg) for reg in (Register.LR, Register.XPSR)}
+    saved_flags = {address: get_byte(address) for address in FLAGS}
+    print(f"{ITERATIONS} iterations of {2 + len(FLAGS)} writes and one register read")
+    try:
+        baseline = measure("commands", with_commands)
+        for name, func in (("helpers", with_helpers), ("batch", with_batch)):
+            elapsed = measure(name, func)
+            print(f"{'':>10}  {baseline / elapsed:.1f}x faster than commands")
+    finally:
+        with Batch() as batch:
+            for reg, value in saved_registers.items():
+                batch.set_register(reg, value)
+            for address, value in saved_flags.items():
+                batch.set_byte(address, value)
+
+
+if __name__ == "__main__":
+    gdb.execute(f"interpreter-exec mi \"-target-select remote :1234\"")
+    main()
+    gdb.execute('quit', to_string=True)
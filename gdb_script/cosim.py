@@ -0,0 +1,54 @@
+"""
+Lock-step co-simulation of the firmware and Gazebo.
+
+Enabled with SWAB_LOCKSTEP=1, which server_start.sh exports when started in lockstep mode; Gazebo
+is then started paused. Every firmware loop iteration calls tick(), which advances the world by
+PERIOD seconds of physics through the world control service and waits for the rover pose stamped
+with the new time. The firmware therefore always sees the world state of its own iteration, motor
+commands are published synchronously, and nothing sleeps: runs go as fast as physics allows and
+repeat step for step.
+"""
+import os
+
+import telemetry
+from lockstep import DEFAULT_STEP_SIZE, TOLERANCE, Lockstep, LockstepError, PoseClock
+
+enabled = os.environ.get("SWAB_LOCKSTEP", "0") == "1"
+# Simulated seconds per firmware loop iteration, and the physics step they are split into.
+PERIOD = float(os.environ.get("SWAB_LOCKSTEP_PERIOD", "0.05"))
+STEP_SIZE = float(os.environ.get("SWAB_LOCKSTEP_STEP_SIZE", str(DEFAULT_STEP_SIZE)))
+TIMEOUT = 10.0
+
+stepper = None
+clock = None
+start = 0.0
+ticks = 0
+steps = 0
+
+
+def init(world, rover_name):
+    """
+    Pause world and take over its stepping. Call it before the other modules track the rover:
+    the first subscription sets the pose rate, and lock-step needs every message.
+    """
+    global stepper, clock, start
+    if not enabled or stepper is not None:
+        return
+    clock = PoseClock(telemetry.track(world, rover_name, msgs_per_sec=None))
+    stepper = Lockstep(telemetry.node, world, STEP_SIZE)
+    stepper.configure()
+    start = stepper.sync(clock, TIMEOUT)
+    print(f"Lock-step: {stepper.steps(PERIOD)} steps of {STEP_SIZE} s per loop, starting at {start:.3f} s")
+
+
+def tick():
+    """Advance the world by one loop period and return once the rover pose has caught up."""
+    global ticks, steps
+    if stepper is None:
+        return
+    ticks += 1
+    # advance() rounds PERIOD to whole physics steps; the clock can only reach what was stepped.
+    steps += stepper.advance(PERIOD)
+    due = start + steps * STEP_SIZE
+    if not clock.wait_until(due - TOLERANCE, TIMEOUT):
+        raise LockstepError(f"Simulation clock did not reach {due:.3f} s within {TIMEOUT} s")
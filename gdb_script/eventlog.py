@@ -0,0 +1,170 @@
+"""
+Binary event log for the CPV gdb scripts.
+
+Breakpoint stop() callbacks run while the firmware is halted, so they only pack a fixed-size
+record (time, pc, event, address, value) into a preallocated ring buffer. A background thread
+drains the buffer to disk every INTERVAL seconds, or sooner once it is half full. If the writer
+falls behind, new records are dropped and counted rather than blocking the callback, and the
+count is logged as a DROPPED event on close.
+
+Decode a log to CSV or JSON with:
+
+    python3 gdb_script/eventlog.py /tmp/gdb_events.bin --format csv
+"""
+import argparse
+import csv
+import json
+import struct
+import sys
+import time
+from enum import IntEnum
+from threading import Event as Signal, Lock, Thread
+
+MAGIC = b"SWEV"
+VERSION = 1
+# magic, version, wall-clock start time
+HEADER = struct.Struct("<4sId")
+# nanoseconds since start, pc, address, event, value
+RECORD = struct.Struct("<QIIH6xd")
+
+DEFAULT_PATH = "/tmp/gdb_events.bin"
+CAPACITY = 4096
+INTERVAL = 0.5
+
+
+class Event(IntEnum):
+    THROTTLE = 1
+    SERVO = 2
+    HOP = 3
+    LOOP = 4
+    COMPASS = 5
+    QUIT = 6
+    DROPPED = 7
+
+
+class EventLog:
+    """Record events into a ring buffer of capacity records, written to path by a background thread."""
+
+    def __init__(self, path=DEFAULT_PATH, capacity=CAPACITY, interval=INTERVAL):
+        self.path = path
+        self._capacity = capacity
+        self._interval = interval
+        self._buffer = bytearray(capacity * RECORD.size)
+        # Total records recorded and drained; slot = count % capacity.
+        self._head = 0
+        self._tail = 0
+        self._lock = Lock()
+        self._wake = Signal()
+        self._closed = False
+        self.dropped = 0
+        self._start = time.monotonic_ns()
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, VERSION, time.time()))
+        self._thread = Thread(target=self._run, name="eventlog", daemon=True)
+        self._thread.start()
+
+    def record(self, event, pc=0, address=0, value=0):
+        stamp = time.monotonic_ns() - self._start
+        with self._lock:
+            pending = self._head - self._tail
+            if pending == self._capacity or self._closed:
+                self.dropped += 1
+                return
+            slot = self._head % self._capacity
+            RECORD.pack_into(self._buffer, slot * RECORD.size, stamp, pc & 0xffffffff, address & 0xffffffff, event, value)
+            self._head += 1
+        if pending + 1 >= self._capacity // 2:
+            self._wake.set()
+
+    def _drain(self):
+        with self._lock:
+            head, tail = self._head, self._tail
+        if head == tail:
+            return
+        # Slots in [tail, head) are not reused until _tail moves, so they can be written unlocked.
+        view = memoryview(self._buffer)
+        start = (tail % self._capacity) * RECORD.size
+        end = (head % self._capacity) * RECORD.size
+        if start < end:
+            self._file.write(view[start:end])
+        else:
+            self._file.write(view[start:])
+            self._file.write(view[:end])
+        with self._lock:
+            self._tail = head
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self._interval)
+            self._wake.clear()
+            self._drain()
+
+    def close(self):
+        """Stop recording, write out everything buffered and close the file."""
+        if self._closed:
+            return
+        self.record(Event.QUIT)
+        with self._lock:
+            self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self._drain()
+        if self.dropped:
+            self._file.write(RECORD.pack(time.monotonic_ns() - self._start, 0, 0, Event.DROPPED, self.dropped))
+        self._file.close()
+
+
+def read(path):
+    """Yield the records of a log as dicts, skipping a truncated last record."""
+    with open(path, "rb") as f:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError(f"{path} is too short for an event log")
+        magic, version, started = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an event log")
+        if version != VERSION:
+            raise ValueError(f"Unsupported event log version {version}")
+        while True:
+            data = f.read(RECORD.size)
+            if len(data) < RECORD.size:
+                return
+            stamp, pc, address, event, value = RECORD.unpack(data)
+            try:
+                name = Event(event).name
+            except ValueError:
+                name = str(event)
+            yield {
+                "time": started + stamp / 1e9,
+                "elapsed": stamp / 1e9,
+                "pc": f"0x{pc:x}",
+                "event": name,
+                "address": f"0x{address:x}",
+                "value": value,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode a binary gdb event log")
+    parser.add_argument("path", nargs="?", default=DEFAULT_PATH)
+    parser.add_argument("--format", choices=("csv", "json"), default="csv")
+    parser.add_argument("-o", "--output", help="Write to this file instead of stdout")
+    args = parser.parse_args()
+
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        records = read(args.path)
+        if args.format == "json":
+            json.dump(list(records), out, indent=2)
+            out.write("\n")
+        else:
+            writer = csv.DictWriter(out, fieldnames=["time", "elapsed", "pc", "event", "address", "value"])
+            writer.writeheader()
+            writer.writerows(records)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
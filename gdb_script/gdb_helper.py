@@ -1,6 +1,8 @@
 import gdb
 from enum import Enum
+import functools
 import json
+import struct
 
 class Register(Enum):
     R0 = "r0"
@@ -74,20 +76,108 @@ class ESP32Registers(Enum):
     LEND = "lend"
     LCOUNT = "lcount"
 
+# Registers and memory go through the gdb Python API rather than formatted `set` commands, which
+# gdb has to parse and evaluate as expressions on every call.
+
+BYTE = struct.Struct("<B")
+FLOAT = struct.Struct("<f")
+
+@functools.lru_cache(maxsize=None)
+def lookup_type(name):
+    """gdb.lookup_type is a symbol table search, so look each type up once."""
+    return gdb.lookup_type(name)
+
+def _write_register(frame, name, value):
+    # Frame.write_register only exists in newer gdb releases.
+    if hasattr(frame, "write_register"):
+        frame.write_register(name, value)
+    else:
+        gdb.execute(f"set ${name} = {value}")
+
 def set_register(reg_name: Register, value):
-    gdb.execute(f"set ${reg_name.value} = {value}")
+    _write_register(gdb.selected_frame(), reg_name.value, value)
 
 def get_register(reg_name: Register):
-    return int(gdb.parse_and_eval(f"${reg_name.value}"))
+    return int(gdb.selected_frame().read_register(reg_name.value))
 
 def set_byte(address, value):
-    gdb.execute(f"set *(unsigned char *){address} = {value}")
+    gdb.selected_inferior().write_memory(address, BYTE.pack(value & 0xff))
+
+def get_byte(address):
+    return BYTE.unpack(gdb.selected_inferior().read_memory(address, BYTE.size))[0]
 
 def jumpto(address):
     gdb.post_event(lambda: gdb.execute(f"jump *{address}"))
 
 def set_float(address, value):
-    gdb.execute(f"set *(float *){address} = {value}")
+    gdb.selected_inferior().write_memory(address, FLOAT.pack(value))
+
+def get_float(address):
+    return FLOAT.unpack(gdb.selected_inferior().read_memory(address, FLOAT.size))[0]
+
+def read_value(address, type_name):
+    """Memory at address as a gdb.Value of type_name, e.g. a struct to inspect field by field."""
+    return gdb.Value(address).cast(lookup_type(type_name).pointer()).dereference()
+
+class Batch:
+    """
+    Queue register and memory writes in a stop() callback and apply them together.
+
+        with Batch() as batch:
+            batch.set_register(Register.LR, 0x46f0)
+            batch.set_byte(0x20000514, 1)
+
+    A later write to the same register or byte replaces the earlier one. Memory is written in
+    one write_memory call per run of adjacent bytes, and the frame and inferior are looked up
+    once for the whole batch. Nothing is written if the block raises.
+    """
+
+    def __init__(self):
+        self._registers = {}
+        self._memory = {}
+
+    def set_register(self, reg_name: Register, value):
+        self._registers[reg_name.value] = value
+
+    def set_byte(self, address, value):
+        self._memory[address] = value & 0xff
+
+    def set_float(self, address, value):
+        self.write(address, FLOAT.pack(value))
+
+    def write(self, address, data):
+        for offset, value in enumerate(data):
+            self._memory[address + offset] = value
+
+    def runs(self):
+        """The queued memory writes as (address, bytes) runs of adjacent addresses."""
+        runs = []
+        for address in sorted(self._memory):
+            if runs and runs[-1][0] + len(runs[-1][1]) == address:
+                runs[-1][1].append(self._memory[address])
+            else:
+                runs.append((address, bytearray([self._memory[address]])))
+        return runs
+
+    def apply(self):
+        if self._memory:
+            inferior = gdb.selected_inferior()
+            for address, data in self.runs():
+                inferior.write_memory(address, bytes(data))
+        if self._registers:
+            frame = gdb.selected_frame()
+            for name, value in self._registers.items():
+                _write_register(frame, name, value)
+        self._registers.clear()
+        self._memory.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.apply()
+        return False
 
 def stepi():
     gdb.execute("stepi")
@@ -1,23 +1,125 @@
-from gz.transport13 import Node
 from gz.msgs10.actuators_pb2 import Actuators
+from threading import Condition, Thread
 import time
 
+import cosim
+import telemetry
+
+MIN_PUBLISH_INTERVAL = 2.0
+
 publisher = None
-a_node = Node()
-def set(value): 
-    if publisher is not None:
+
+
+class CoalescingPublisher:
+    """
+    Publish motor commands from a background thread so gdb stop() callbacks never block.
+    Only the latest submitted throttle is kept; values equal to the last published one are
+    dropped, and two publishes are always at least min_interval seconds apart.
+    """
+
+    def __init__(self, gz_publisher, min_interval=MIN_PUBLISH_INTERVAL):
+        self._publisher = gz_publisher
+        self._min_interval = min_interval
+        self._cond = Condition()
+        self._pending = None
+        self._last = None
+        # The first command also waits min_interval, giving subscribers time to connect.
+        self._last_time = time.monotonic()
+        self._closed = False
+        self.published = 0
+        self.coalesced = 0
+        self.duplicates = 0
+        self._thread = Thread(target=self._run, name="motor", daemon=True)
+        self._thread.start()
+
+    def submit(self, value):
+        with self._cond:
+            if self._pending is not None:
+                self.coalesced += 1
+            elif value == self._last:
+                self.duplicates += 1
+                return
+            self._pending = value
+            self._cond.notify()
+
+    def publish_now(self, value):
+        """Publish value from the calling thread, bypassing the queue and min_interval."""
+        with self._cond:
+            if value == self._last:
+                self.duplicates += 1
+                return
+            self._last = value
+            self._last_time = time.monotonic()
+            self.published += 1
+        self._publish(value)
+
+    def close(self, timeout=None):
+        """Publish the pending command right away and stop the thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "published": self.published,
+            "coalesced": self.coalesced,
+            "duplicates": self.duplicates,
+        }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                while not self._closed:
+                    remaining = self._last_time + self._min_interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                value = self._pending
+                self._pending = None
+                if value is not None and value == self._last:
+                    self.duplicates += 1
+                    value = None
+                if value is None and self._closed:
+                    return
+
+            if value is not None:
+                self._publish(value)
+                with self._cond:
+                    self._last = value
+                    self._last_time = time.monotonic()
+                    self.published += 1
+
+    def _publish(self, value):
         msg = Actuators()
         msg.velocity.append(float(value) * 200000)
         msg.velocity.append(float(value) * 200000)
-        time.sleep(2)
-        publisher.publish(msg)
+        self._publisher.publish(msg)
         print(f"Send Throttle Value {value} to Gazebo")
+
+
+def set(value):
+    if publisher is not None and cosim.enabled:
+        # The world only moves on cosim.tick(), so the command must be out before it.
+        publisher.publish_now(value)
+    elif publisher is not None:
+        publisher.submit(value)
     else:
         print("Error with Motor publisher")
 
 
-def init(rover_name):
+def flush():
+    """Push out the last command before the session exits and print the counters."""
+    if publisher is not None:
+        publisher.close(timeout=1.0)
+        print(f"Motor commands: {publisher.stats()}")
+
+
+def init(rover_name, min_interval=MIN_PUBLISH_INTERVAL):
     global publisher
-    publisher = a_node.advertise(f"/model/{rover_name}/command/motor_speed", Actuators)
-    if not publisher.valid():
+    gz_publisher = telemetry.node.advertise(f"/model/{rover_name}/command/motor_speed", Actuators)
+    if not gz_publisher.valid():
         print("motor publisher is not valid")
+    publisher = CoalescingPublisher(gz_publisher, min_interval)
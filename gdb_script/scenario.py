@@ -0,0 +1,368 @@
+"""
+Declarative CPV attack scenarios.
+
+A scenario is a JSON spec in gdb_script/scenarios/ describing the hooks to install in the firmware
+and what each one does; this module is the single runtime that installs and runs them. A spec has
+
+    name, world, rover      names of the scenario, the Gazebo world and the rover model
+    modules                 which of "servo", "motor" and "compass" to connect to Gazebo
+    setup                   actions run once before the firmware is continued
+    hooks                   list of hooks
+
+A hook is a breakpoint ("at"), an access/write/read watchpoint ("watch", with "access"), or
+breakpoints on every instruction that stores to a RAM address ("stores", with the store "width" in
+bytes), found by scanning the firmware's Thumb code (thumb.py). Store hooks capture the value being
+written as "stored" at breakpoint cost, and fall back to a write watchpoint if no store is found or
+if any of the store pcs listed in "sites" is missing from the scan. Locations are addresses like
+"0x46f0", symbol names or "symbol+offset", resolved at startup from the cached symbol index of the
+firmware ELF (symbols.py) or else by gdb. A hook may capture a value on every hit, record an event
+in the event log, run a list of actions and end the session with a stop condition:
+
+    {"stores": "0x2000049a", "width": 1, "sites": ["0x47e8", "0x48d2"],
+     "event": "THROTTLE", "capture": "stored",
+     "actions": [{"do": "motor"}],
+     "stop": {"captured": 0}}
+
+Values are numbers, register names ("r1", "lr"), "captured", "hits", "compass", "stored", or a
+{"register": ..., "by_pc": {pc: register}} choice on the current pc. Actions are
+
+    set_register, set_byte, set_float    register/address and value; queued into one gdb_helper.Batch
+    motor                                forward value (default: captured) to the motor
+    servo                                forward value to the servo, with check_position and maxturn
+    jump                                 leave the hook by jumping to "to"; halts and resumes via gdb
+    set_pc                               continue at "to" without halting
+    tick                                 advance the world one period in lock-step mode (cosim.tick)
+
+and any action can be limited to the first hit with "once". Stop conditions are "captured" (quit
+once the captured value equals it) and "max_hits" (quit after more hits than that).
+
+Run a scenario by name or path with SWAB_SCENARIO, e.g.
+
+    SWAB_SCENARIO=emi gdb -nw -q -x gdb_script/scenario.py firmwareM4_executable.elf
+"""
+import sys
+import os
+import json
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import gdb
+from gdb_helper import *
+import compass
+import cosim
+import eventlog
+import motor
+import servo
+import symbols
+import telemetry
+import thumb
+from eventlog import Event
+from symbols import SymbolError
+
+SCENARIOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenarios")
+MODULES = {"servo": servo, "motor": motor, "compass": compass}
+WATCH_CLASSES = {"access": gdb.WP_ACCESS, "write": gdb.WP_WRITE, "read": gdb.WP_READ}
+WIDTH_TYPES = {1: "unsigned char", 2: "unsigned short", 4: "unsigned int"}
+REGISTERS = [Register(f"r{number}") for number in range(16)]
+
+log = None
+index = None
+elf = None
+
+
+class ScenarioError(Exception):
+    pass
+
+
+def location(value):
+    """
+    An address as int, from an int, a "0x..." string or a symbol in the firmware index.
+    Anything that cannot be resolved is returned as is, for gdb to look up.
+    """
+    if isinstance(value, int):
+        return value
+    try:
+        return int(value, 0)
+    except ValueError:
+        pass
+    if index is not None:
+        try:
+            return index.resolve(value)
+        except (SymbolError, ValueError):
+            pass
+    return value
+
+
+def find_stores(address, width=None):
+    """Store sites writing address in the firmware, or [] if the ELF cannot be scanned."""
+    if elf is None or not isinstance(address, int):
+        return []
+    try:
+        return thumb.store_sites(elf, address, width)
+    except (OSError, SymbolError) as e:
+        print(f"Cannot scan {elf} for stores to 0x{address:x}: {e}")
+        return []
+
+
+def load_symbols():
+    """Index the ELF gdb was started with; scenarios still run on gdb lookups without it."""
+    global index, elf
+    path = gdb.current_progspace().filename
+    if path is None:
+        return
+    elf = path
+    try:
+        index = symbols.load(path)
+        print(f"Loaded {len(index)} symbols of {path}")
+    except (OSError, SymbolError) as e:
+        print(f"No symbol index for {path}: {e}")
+
+
+def _register(name):
+    try:
+        return Register(name)
+    except ValueError:
+        raise ScenarioError(f"Unknown register {name!r}") from None
+
+
+def compile_value(spec):
+    """Turn a value spec into a function of (hook, captured), resolved once at load time."""
+    if isinstance(spec, (int, float)) and not isinstance(spec, bool):
+        return lambda hook, captured: spec
+    if spec == "captured":
+        return lambda hook, captured: captured
+    if spec == "hits":
+        return lambda hook, captured: hook.hits
+    if spec == "compass":
+        return lambda hook, captured: compass.get()
+    if spec == "stored":
+        return lambda hook, captured: hook.stored()
+    if isinstance(spec, str) and isinstance(location(spec), int):
+        number = location(spec)
+        return lambda hook, captured: number
+    if isinstance(spec, str):
+        register = _register(spec)
+        return lambda hook, captured: get_register(register)
+    if isinstance(spec, dict) and "register" in spec:
+        default = _register(spec["register"])
+        by_pc = {location(pc): _register(name) for pc, name in spec.get("by_pc", {}).items()}
+        if not by_pc:
+            return lambda hook, captured: get_register(default)
+        return lambda hook, captured: get_register(by_pc.get(get_register(Register.R15), default))
+    raise ScenarioError(f"Invalid value {spec!r}")
+
+
+class Action:
+    """One compiled action. run() returns True when the hook has to halt the target."""
+
+    def __init__(self, spec):
+        self.kind = spec.get("do")
+        self.once = spec.get("once", False)
+        self.batched = self.kind in ("set_register", "set_byte", "set_float")
+        self._value = compile_value(spec.get("value", "captured"))
+
+        if self.kind == "set_register":
+            self._register = _register(spec["register"])
+        elif self.kind in ("set_byte", "set_float"):
+            self._address = location(spec["address"])
+        elif self.kind in ("jump", "set_pc"):
+            self._target = location(spec["to"])
+        elif self.kind == "servo":
+            self._check_position = spec.get("check_position", False)
+            self._maxturn = spec.get("maxturn")
+        elif self.kind not in ("motor", "tick"):
+            raise ScenarioError(f"Unknown action {self.kind!r}")
+
+    def queue(self, batch, hook, captured):
+        if self.kind == "set_register":
+            batch.set_register(self._register, self._value(hook, captured))
+        elif self.kind == "set_byte":
+            batch.set_byte(self._address, int(self._value(hook, captured)))
+        else:
+            batch.set_float(self._address, float(self._value(hook, captured)))
+
+    def run(self, hook, captured, rover):
+        if self.kind == "motor":
+            motor.set(self._value(hook, captured))
+        elif self.kind == "servo":
+            servo.set(
+                rover, self._value(hook, captured), check_position=self._check_position, maxturn=self._maxturn
+            )
+        elif self.kind == "tick":
+            cosim.tick()
+        elif self.kind == "set_pc":
+            set_register(Register.R15, self._target)
+        elif self.kind == "jump":
+            gdb.post_event(lambda: gdb.execute(f"jump *{self._target}"))
+            # gdb only runs the posted jump once the target has stopped.
+            return True
+        return False
+
+
+def run_actions(actions, hook, captured, rover):
+    """
+    Run actions in order; consecutive memory and register writes go out as one batch.
+    hook is None for the setup actions.
+    """
+    halt = False
+    batch = Batch()
+    for action in actions:
+        if action.once and hook is not None and hook.hits > 1:
+            continue
+        if action.batched:
+            action.queue(batch, hook, captured)
+            continue
+        batch.apply()
+        halt = action.run(hook, captured, rover) or halt
+    batch.apply()
+    return halt
+
+
+class Trigger(gdb.Breakpoint):
+    """A breakpoint or watchpoint that fires its hook; site is set on store-site breakpoints."""
+
+    def __init__(self, hook, spec, site=None, wp_class=None):
+        if wp_class is None:
+            super(Trigger, self).__init__(spec, type=gdb.BP_BREAKPOINT)
+        else:
+            super(Trigger, self).__init__(spec, type=gdb.BP_WATCHPOINT, wp_class=wp_class)
+        self.hook = hook
+        self.site = site
+
+    def stop(self):
+        return self.hook.fire(self)
+
+
+class Hook:
+    def __init__(self, runtime, spec):
+        self.runtime = runtime
+        self.hits = 0
+        self.name = spec.get("name", "")
+        self.width = spec.get("width", 1)
+        self.trigger = None
+        if "stores" in spec:
+            self.kind = "stores"
+            self.address = location(spec["stores"])
+            sites = find_stores(self.address, spec.get("width"))
+            # Known store pcs; if the scan misses any of them it is not trusted for the others either.
+            unfound = {location(pc) for pc in spec.get("sites", [])} - {site.pc for site in sites}
+            missing = sorted(f"0x{pc:x}" if isinstance(pc, int) else pc for pc in unfound)
+            if sites and not missing:
+                self.triggers = [Trigger(self, f"*{site.pc}", site) for site in sites]
+            else:
+                if sites:
+                    print(f"Store sites {', '.join(missing)} not found for {self.name}, watching writes instead")
+                else:
+                    print(f"No store sites found for {self.name}, watching writes instead")
+                target = f"*({WIDTH_TYPES[self.width]} *){self.address}"
+                self.triggers = [Trigger(self, target, wp_class=gdb.WP_WRITE)]
+        elif "watch" in spec:
+            self.kind = "watch"
+            self.address = location(spec["watch"])
+            target = f"*{self.address}" if isinstance(self.address, int) else self.address
+            self.triggers = [Trigger(self, target, wp_class=WATCH_CLASSES[spec.get("access", "access")])]
+        else:
+            self.kind = "at"
+            self.address = location(spec["at"])
+            self.triggers = [Trigger(self, f"*{self.address}")]
+        self.event = Event[spec["event"]] if "event" in spec else None
+        self.capture = compile_value(spec["capture"]) if "capture" in spec else None
+        self.actions = [Action(action) for action in spec.get("actions", [])]
+        stop = spec.get("stop", {})
+        self.stop_captured = stop.get("captured")
+        self.max_hits = stop.get("max_hits")
+
+    def stored(self):
+        """The value being stored to a "stores" hook's address."""
+        site = self.trigger.site
+        if site is None:
+            # Write watchpoint fallback: the store has already happened.
+            data = gdb.selected_inferior().read_memory(self.address, self.width)
+            return int.from_bytes(bytes(data), "little")
+        return get_register(REGISTERS[site.register]) & ((1 << 8 * site.width) - 1)
+
+    def fire(self, trigger):
+        site = trigger.site
+        # The scan is static; skip stores whose base register does not hold the expected address.
+        if site is not None and get_register(REGISTERS[site.base_register]) & 0xffffffff != site.base:
+            return False
+        self.trigger = trigger
+        self.hits += 1
+        captured = self.capture(self, None) if self.capture is not None else None
+        if self.event is not None:
+            if site is not None:
+                pc = site.pc
+            elif self.kind == "at":
+                pc = self.address
+            else:
+                pc = get_register(Register.R15)
+            value = captured if captured is not None else self.hits
+            log.record(self.event, pc, self.address if isinstance(self.address, int) else 0, value)
+        halt = run_actions(self.actions, self, captured, self.runtime.rover)
+        if (self.stop_captured is not None and captured == self.stop_captured) or (
+            self.max_hits is not None and self.hits > self.max_hits
+        ):
+            self.runtime.finish()
+        return halt
+
+
+class Scenario:
+    def __init__(self, spec):
+        self.name = spec.get("name", "scenario")
+        self.world = spec.get("world", "default")
+        self.rover = spec.get("rover", "r1_rover")
+        self.modules = spec.get("modules", [])
+        for module in self.modules:
+            if module not in MODULES:
+                raise ScenarioError(f"Unknown module {module!r}")
+        self.motor = "motor" in self.modules
+        self.hook_specs = spec.get("hooks", [])
+        self.setup = [Action(action) for action in spec.get("setup", [])]
+        self.hooks = []
+
+    def install(self):
+        global log
+        log = eventlog.EventLog()
+        # Lock-step has to subscribe to the pose first; it is a no-op otherwise.
+        cosim.init(self.world, self.rover)
+        for module in self.modules:
+            if module == "motor":
+                motor.init(self.rover)
+            else:
+                MODULES[module].init(self.world, self.rover)
+        for spec in self.hook_specs:
+            hook = Hook(self, spec)
+            self.hooks.append(hook)
+            address = f"0x{hook.address:x}" if isinstance(hook.address, int) else hook.address
+            sites = ", ".join(f"0x{t.site.pc:x}" for t in hook.triggers if t.site is not None)
+            print(f"Hook {hook.name} set on {hook.kind} {address}" + (f" at {sites}" if sites else ""))
+        run_actions(self.setup, None, None, self.rover)
+
+    def finish(self):
+        if self.motor:
+            motor.flush()
+        telemetry.report()
+        log.close()
+        gdb.execute('quit', to_string=True)
+
+
+def load(name):
+    """Load a scenario by name from gdb_script/scenarios, or from a path to a JSON spec."""
+    path = name if os.path.exists(name) else os.path.join(SCENARIOS, f"{name}.json")
+    try:
+        with open(path) as f:
+            spec = json.load(f)
+    except FileNotFoundError:
+        raise ScenarioError(f"No scenario {name!r}") from None
+    return Scenario(spec)
+
+
+def main(name=None):
+    load_symbols()
+    scenario = load(name or os.environ["SWAB_SCENARIO"])
+    print(f"Running scenario {scenario.name}")
+    gdb.execute(f"interpreter-exec mi \"-target-select remote :1234\"")
+    scenario.install()
+    gdb.execute('continue')
+
+
+if __name__ == "__main__":
+    main()
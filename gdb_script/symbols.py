@@ -0,0 +1,215 @@
+"""
+Symbol index for the firmware ELF.
+
+The symbol table is parsed once and saved as JSON under CACHE_DIR, keyed by the SHA-256 of the
+ELF, so a rebuilt firmware gets a fresh index and an unchanged one is never parsed again. Hashing
+a large ELF is itself slow, so the hash is remembered per path, size and modification time.
+
+    index = symbols.load("/app/firmwareM4_executable.elf")
+    index.address("main")                 # name -> address
+    index.resolve("process_motors+0x1a")  # name, name+offset or a plain "0x..." address
+    index.function(0x47ea)                # address -> ("process_motors", 0x1a)
+
+Lookups are dictionary hits: address -> function goes through buckets of BUCKET bytes holding the
+few functions that overlap them. Thumb function addresses are stored with bit 0 cleared.
+
+    python3 gdb_script/symbols.py firmware.elf main 0x47ea
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+CACHE_DIR = os.environ.get("SWAB_SYMBOL_CACHE", os.path.expanduser("~/.cache/swab/symbols"))
+VERSION = 1
+BUCKET = 256
+
+SHT_SYMTAB = 2
+SHT_DYNSYM = 11
+STT_OBJECT = 1
+STT_FUNC = 2
+STB_LOCAL = 0
+EM_ARM = 40
+
+KINDS = {STT_OBJECT: "object", STT_FUNC: "function"}
+
+
+class SymbolError(Exception):
+    pass
+
+
+def formats(data):
+    """Struct formats for the ELF header, section headers and symbols of this ELF's class/endianness."""
+    if data[:4] != b"\x7fELF":
+        raise SymbolError("Not an ELF file (is it still a git-lfs pointer?)")
+    order = {1: "<", 2: ">"}.get(data[5])
+    if order is None:
+        raise SymbolError(f"Unknown ELF data encoding {data[5]}")
+    if data[4] == 1:
+        # e_type .. e_shstrndx; section header; Elf32_Sym
+        return order, struct.Struct(order + "HHIIIIIHHHHHH"), struct.Struct(order + "IIIIIIIIII"), "32"
+    if data[4] == 2:
+        return order, struct.Struct(order + "HHIQQQIHHHHHH"), struct.Struct(order + "IIQQQQIIQQ"), "64"
+    raise SymbolError(f"Unknown ELF class {data[4]}")
+
+
+def parse(path):
+    """Read the functions and data objects of the ELF symbol table as {name: (address, size, kind)}."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        order, header, section, bits = formats(data)
+        _, machine, _, _, _, shoff, _, _, _, _, shentsize, shnum, _ = header.unpack_from(data, 16)
+        sections = [section.unpack_from(data, shoff + i * shentsize) for i in range(shnum)]
+        tables = [s for s in sections if s[1] == SHT_SYMTAB] or [s for s in sections if s[1] == SHT_DYNSYM]
+        if not tables:
+            raise SymbolError(f"{path} has no symbol table")
+        _, _, _, _, offset, size, link, _, _, entsize = tables[0]
+        strtab = sections[link][4]
+        if bits == "32":
+            sym = struct.Struct(order + "IIIBBH")
+        else:
+            sym = struct.Struct(order + "IBBHQQ")
+
+        symbols = {}
+        for start in range(offset, offset + size, entsize):
+            if bits == "32":
+                name, value, length, info, _, shndx = sym.unpack_from(data, start)
+            else:
+                name, info, _, shndx, value, length = sym.unpack_from(data, start)
+            kind = KINDS.get(info & 0xf)
+            if kind is None or shndx == 0 or name == 0:
+                continue
+            end = data.find(b"\0", strtab + name)
+            label = data[strtab + name:end].decode(errors="replace")
+            if machine == EM_ARM and kind == "function":
+                value &= ~1
+            # A global wins over file-local statics of the same name.
+            if label in symbols and info >> 4 == STB_LOCAL:
+                continue
+            symbols[label] = (value, length, kind)
+        return symbols
+
+
+def sha256(path, cache_dir=CACHE_DIR):
+    """SHA-256 of path, remembered by path, size and mtime so unchanged files are hashed once."""
+    stat = os.stat(path)
+    stamps_path = os.path.join(cache_dir, "stamps.json")
+    key = os.path.abspath(path)
+    try:
+        with open(stamps_path) as f:
+            stamps = json.load(f)
+    except (OSError, ValueError):
+        stamps = {}
+    stamp = stamps.get(key)
+    if stamp and stamp[0] == stat.st_size and stamp[1] == stat.st_mtime_ns:
+        return stamp[2]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    stamps[key] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+    write_json(stamps_path, stamps)
+    return digest.hexdigest()
+
+
+def write_json(path, value):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(value, f)
+    os.replace(tmp, path)
+
+
+class SymbolIndex:
+    def __init__(self, symbols, digest=None):
+        self.digest = digest
+        self._symbols = symbols
+        self._buckets = {}
+        for name, (address, size, kind) in symbols.items():
+            if kind != "function":
+                continue
+            end = address + max(size, 1)
+            for bucket in range(address // BUCKET, (end - 1) // BUCKET + 1):
+                self._buckets.setdefault(bucket, []).append((address, end, name))
+
+    def __len__(self):
+        return len(self._symbols)
+
+    def __contains__(self, name):
+        return name in self._symbols
+
+    def address(self, name):
+        try:
+            return self._symbols[name][0]
+        except KeyError:
+            raise SymbolError(f"Unknown symbol {name!r}") from None
+
+    def size(self, name):
+        return self._symbols[name][1]
+
+    def functions(self):
+        """Start addresses of all functions."""
+        return [address for address, _, kind in self._symbols.values() if kind == "function"]
+
+    def resolve(self, location):
+        """Address of an int, a "0x..." string, a symbol name or "name+offset"."""
+        if isinstance(location, int):
+            return location
+        try:
+            return int(location, 0)
+        except ValueError:
+            pass
+        name, plus, offset = location.partition("+")
+        return self.address(name.strip()) + (int(offset, 0) if plus else 0)
+
+    def function(self, address):
+        """The (name, offset) of the function containing address, or None."""
+        for start, end, name in self._buckets.get(address // BUCKET, ()):
+            if start <= address < end:
+                return name, address - start
+        return None
+
+    def describe(self, address):
+        found = self.function(address)
+        if found is None:
+            return f"0x{address:x}"
+        name, offset = found
+        return f"{name}+0x{offset:x}" if offset else name
+
+
+def load(path, cache_dir=CACHE_DIR):
+    """The index of the ELF at path, from the cache if this exact file was indexed before."""
+    digest = sha256(path, cache_dir)
+    index_path = os.path.join(cache_dir, f"{digest}.json")
+    try:
+        with open(index_path) as f:
+            cached = json.load(f)
+        if cached.get("version") == VERSION:
+            return SymbolIndex({name: tuple(entry) for name, entry in cached["symbols"].items()}, digest)
+    except (OSError, ValueError):
+        pass
+
+    symbols = parse(path)
+    write_json(index_path, {"version": VERSION, "symbols": symbols})
+    return SymbolIndex(symbols, digest)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(f"usage: {sys.argv[0]} ELF [name|address ...]")
+        sys.exit(1)
+    index = load(sys.argv[1])
+    print(f"{len(index)} symbols, sha256 {index.digest}")
+    for query in sys.argv[2:]:
+        try:
+            address = int(query, 0)
+        except ValueError:
+            print(f"{query} = 0x{index.resolve(query):x}")
+        else:
+            print(f"0x{address:x} = {index.describe(address)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Shared gz-transport state for the CPV gdb scripts.
+
+One gdb session loads servo, compass and motor together. They all use the single Node
+created here, and each world gets exactly one subscription to its pose topic, whose
+messages are fanned out to every registered consumer.
+"""
+import os
+import sys
+import time
+import resource
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from gz.transport13 import Node, SubscribeOptions
+from gz.msgs10.pose_v_pb2 import Pose_V
+
+from rover import PoseDemux, PoseHandler, PoseServiceClient, euler_to_quaternion
+
+node = Node()
+fanouts = {}
+demuxes = {}
+handlers = {}
+pose_clients = {}
+
+# Budget for the whole gdb process; 0 disables a limit.
+budget = {"rss_mb": 0, "callback_ms": 0}
+
+
+class PoseFanout:
+    """Single pose subscription callback that forwards every message to all consumers."""
+
+    def __init__(self):
+        self._consumers = []
+        self.callbacks = 0
+        self.cpu_time = 0.0
+        self.max_cpu_time = 0.0
+
+    def add(self, consumer):
+        self._consumers = self._consumers + [consumer]
+
+    def __call__(self, msg: Pose_V):
+        start = time.thread_time()
+        for consumer in self._consumers:
+            consumer(msg)
+        elapsed = time.thread_time() - start
+        self.callbacks += 1
+        self.cpu_time += elapsed
+        if elapsed > self.max_cpu_time:
+            self.max_cpu_time = elapsed
+
+
+def subscribe(world, consumer, msgs_per_sec=5):
+    """
+    Register consumer for the pose messages of world, subscribing on first use.
+    msgs_per_sec of None delivers every message.
+    """
+    fanout = fanouts.get(world)
+    if fanout is None:
+        fanout = PoseFanout()
+        pose_options = SubscribeOptions()
+        if msgs_per_sec is not None:
+            pose_options.msgs_per_sec = msgs_per_sec
+        if not node.subscribe(Pose_V, f"/world/{world}/pose/info", fanout, pose_options):
+            print("pose subscription failed!")
+        else:
+            print("pose subscription succeed!")
+        fanouts[world] = fanout
+    fanout.add(consumer)
+
+
+def track(world, model_name, msgs_per_sec=5):
+    """
+    Return the PoseHandler for model_name, shared by every script that tracks it.
+    All models tracked in one world are located by a single pass over each message.
+    """
+    key = (world, model_name)
+    handler = handlers.get(key)
+    if handler is None:
+        handler = handlers[key] = PoseHandler(model_name)
+        demux = demuxes.get(world)
+        if demux is None:
+            demux = demuxes[world] = PoseDemux()
+            subscribe(world, demux, msgs_per_sec)
+        demux.add(handler)
+    return handler
+
+
+def set_pose_via_service(
+    model_name="r1_rover",
+    x=0.0, y=0.0, z=0.0,
+    roll_deg=0.0, pitch_deg=0.0, yaw_deg=180.0,
+    service="/world/default/set_pose",
+    wait=True
+):
+    """
+    Call the set_pose service in Gazebo to set a model's pose over the shared node.
+    """
+    client = pose_clients.get(service)
+    if client is None:
+        client = pose_clients[service] = PoseServiceClient(node, service)
+    ok = client.set_pose(model_name, x, y, z, roll_deg, pitch_deg, yaw_deg, wait=wait)
+    if wait:
+        print(f"set_pose {model_name} {'succeeded' if ok else 'failed'} in {client.latencies[-1] * 1000:.2f} ms")
+    return ok
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / (1024 * 1024)
+    except OSError:
+        # ru_maxrss is the peak, in KiB on Linux.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def usage():
+    """Current memory and pose-callback CPU usage of this process."""
+    callbacks = sum(f.callbacks for f in fanouts.values())
+    cpu_time = sum(f.cpu_time for f in fanouts.values())
+    return {
+        "rss_mb": _rss_mb(),
+        "pose_callbacks": callbacks,
+        "callback_cpu_s": cpu_time,
+        "callback_mean_ms": cpu_time / callbacks * 1000 if callbacks else 0.0,
+        "callback_max_ms": max((f.max_cpu_time for f in fanouts.values()), default=0.0) * 1000,
+    }
+
+
+def set_budget(rss_mb=0, callback_ms=0):
+    budget["rss_mb"] = rss_mb
+    budget["callback_ms"] = callback_ms
+
+
+def report():
+    """Print the usage counters and flag every budget that was exceeded."""
+    current = usage()
+    print(f"Telemetry usage: {current}")
+    if budget["rss_mb"] and current["rss_mb"] > budget["rss_mb"]:
+        print(f"Memory budget exceeded: {current['rss_mb']:.1f} MB > {budget['rss_mb']} MB")
+    if budget["callback_ms"] and current["callback_mean_ms"] > budget["callback_ms"]:
+        print(f"Callback budget exceeded: {current['callback_mean_ms']:.3f} ms > {budget['callback_ms']} ms")
+    return current
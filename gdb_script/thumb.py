@@ -0,0 +1,191 @@
+"""
+Find the Thumb store instructions that write a RAM address.
+
+The firmware loads a base address into a register, from a literal pool or with MOVW/MOVT, and
+stores through it with an immediate offset, e.g.
+
+    000047E8    STRB    R2, [R3,#2]     ; R3 = 0x20000498, writes 0x2000049a
+
+store_sites() sweeps the executable sections of the ELF, tracks such constants per register and
+returns every STR/STRH/STRB whose base plus offset is the target, with the register being stored.
+A breakpoint on the store sees the new value in that register before it is written, which is far
+cheaper under QEMU's gdbstub than an access watchpoint and is not triggered by reads.
+
+The sweep is a heuristic: a constant is forgotten once its register may have been overwritten and
+at every branch, but data in literal pools is decoded as if it were code. Such data can look like
+the first half of a 32-bit instruction and swallow the next halfword, so decoding restarts at every
+function start in the symbol table. Callers should check the live base register against
+StoreSite.base before trusting a hit.
+
+Sites are cached next to the symbol index, keyed by the ELF hash.
+"""
+import json
+import mmap
+import os
+import struct
+from collections import namedtuple
+
+import symbols
+
+StoreSite = namedtuple("StoreSite", "pc register base_register base offset width")
+
+VERSION = 2
+SHF_EXECINSTR = 0x4
+HALFWORD = struct.Struct("<H")
+WORD = struct.Struct("<I")
+
+
+def executable_sections(path):
+    """(address, bytes) of every executable section of the ELF at path."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        order, header, section, bits = symbols.formats(data)
+        _, _, _, _, _, shoff, _, _, _, _, shentsize, shnum, _ = header.unpack_from(data, 16)
+        found = []
+        for i in range(shnum):
+            _, kind, flags, address, offset, size, _, _, _, _ = section.unpack_from(data, shoff + i * shentsize)
+            # SHT_NOBITS sections have no bytes in the file.
+            if flags & SHF_EXECINSTR and kind != 8 and size:
+                found.append((address, bytes(data[offset:offset + size])))
+        return found
+
+
+def _literal(code, start, address):
+    """Word at address if it lies inside this section."""
+    offset = address - start
+    if 0 <= offset <= len(code) - 4:
+        return WORD.unpack_from(code, offset)[0]
+    return None
+
+
+def _movw_imm(hw1, hw2):
+    return ((hw1 & 0xf) << 12) | (((hw1 >> 10) & 1) << 11) | (((hw2 >> 12) & 7) << 8) | (hw2 & 0xff)
+
+
+def decode(code, start, target, width=None, functions=()):
+    """
+    Store sites writing target in one section of Thumb code starting at address start.
+    Decoding restarts with no known constants at each address in functions.
+    """
+    sites = []
+    known = {}
+    pc = start
+    end = start + len(code)
+    entries = sorted(address for address in set(functions) if start <= address < end and not address & 1)
+    following = 0
+    while pc + 2 <= end:
+        while following < len(entries) and entries[following] <= pc:
+            # A pc past the entry means the previous "instruction" ran into this function.
+            pc = entries[following]
+            known.clear()
+            following += 1
+        hw = HALFWORD.unpack_from(code, pc - start)[0]
+        top = hw >> 11
+
+        if top in (0b11101, 0b11110, 0b11111):
+            if pc + 4 > end:
+                break
+            hw2 = HALFWORD.unpack_from(code, pc - start + 2)[0]
+            rn = hw & 0xf
+            rt = hw2 >> 12
+            if (hw & 0xfbf0) == 0xf240:
+                known[(hw2 >> 8) & 0xf] = _movw_imm(hw, hw2)
+            elif (hw & 0xfbf0) == 0xf2c0:
+                rd = (hw2 >> 8) & 0xf
+                if rd in known:
+                    known[rd] = (known[rd] & 0xffff) | (_movw_imm(hw, hw2) << 16)
+            elif (hw & 0xff7f) == 0xf85f:
+                # LDR.W Rt, [PC, #+/-imm12]
+                base = (pc + 4) & ~3
+                value = _literal(code, start, base + (hw2 & 0xfff if hw & 0x80 else -(hw2 & 0xfff)))
+                known.pop(rt, None)
+                if value is not None:
+                    known[rt] = value
+            elif (hw & 0xfff0) in (0xf880, 0xf8a0, 0xf8c0):
+                # STRB.W / STRH.W / STR.W Rt, [Rn, #imm12]
+                size = {0xf880: 1, 0xf8a0: 2, 0xf8c0: 4}[hw & 0xfff0]
+                offset = hw2 & 0xfff
+                if rn in known and known[rn] + offset == target and width in (None, size):
+                    sites.append(StoreSite(pc, rt, rn, known[rn], offset, size))
+            elif (hw & 0xf800) == 0xf000 and (hw2 & 0xd000) in (0xd000, 0x9000, 0x8000):
+                # BL, B.W and conditional B.W
+                known.clear()
+            else:
+                # Most 32-bit instructions write Rd in hw2[11:8] or Rt in hw2[15:12].
+                known.pop((hw2 >> 8) & 0xf, None)
+                known.pop(rt, None)
+                if (hw & 0xffd0) in (0xe890, 0xe910):
+                    # LDM.W / POP.W may load the pc
+                    known.clear()
+            pc += 4
+            continue
+
+        low = hw & 7
+        if top == 0b01001:
+            # LDR Rt, [PC, #imm8 * 4]
+            rt = (hw >> 8) & 7
+            value = _literal(code, start, ((pc + 4) & ~3) + (hw & 0xff) * 4)
+            known.pop(rt, None)
+            if value is not None:
+                known[rt] = value
+        elif top in (0b01100, 0b01110, 0b10000):
+            # STR / STRB / STRH Rt, [Rn, #imm5 * size]
+            size = {0b01100: 4, 0b01110: 1, 0b10000: 2}[top]
+            rn = (hw >> 3) & 7
+            offset = ((hw >> 6) & 0x1f) * size
+            if rn in known and known[rn] + offset == target and width in (None, size):
+                sites.append(StoreSite(pc, low, rn, known[rn], offset, size))
+        elif top >> 2 == 0b001:
+            # MOVS / CMP / ADDS / SUBS Rd, #imm8
+            if (hw >> 11) & 3 != 0b01:
+                known.pop((hw >> 8) & 7, None)
+        elif (hw >> 10) == 0b010001:
+            # ADD / MOV with high registers, BX / BLX
+            if (hw >> 8) & 3 == 0b11:
+                known.clear()
+            elif (hw >> 8) & 3 != 0b01:
+                known.pop(((hw >> 4) & 8) | low, None)
+        elif top in (0b10011, 0b10100, 0b10101, 0b11001):
+            # LDR SP-relative, ADR, ADD SP, LDM
+            known.pop((hw >> 8) & 7, None)
+            if top == 0b11001:
+                for reg in range(8):
+                    if hw & (1 << reg):
+                        known.pop(reg, None)
+        elif top >> 1 == 0b1101 or top == 0b11100 or (hw & 0xfe00) == 0xbc00 or (hw & 0xf500) == 0xb100:
+            # Conditional and unconditional branches, POP, CBZ / CBNZ
+            known.clear()
+        elif top <= 0b00011 or (hw >> 10) == 0b010000 or top in (0b01010, 0b01011, 0b01101, 0b01111, 0b10001):
+            # Shifts, ADDS / SUBS registers, data processing, loads: Rd in bits 2:0
+            if (hw >> 9) != 0b0101000 and (hw >> 9) != 0b0101001 and (hw >> 9) != 0b0101010:
+                known.pop(low, None)
+        elif (hw & 0xff00) == 0xb200 or (hw & 0xff00) == 0xba00:
+            # SXTH / UXTB ... and REV: Rd in bits 2:0
+            known.pop(low, None)
+        pc += 2
+    return sites
+
+
+def _cache_path(digest, cache_dir):
+    return os.path.join(cache_dir, f"{digest}.stores.json")
+
+
+def store_sites(path, target, width=None, cache_dir=symbols.CACHE_DIR):
+    """Store sites writing target in the ELF at path, from the cache if it was scanned before."""
+    digest = symbols.sha256(path, cache_dir)
+    cache_path = _cache_path(digest, cache_dir)
+    key = f"{VERSION}/0x{target:x}/{width or 0}"
+    try:
+        with open(cache_path) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        cached = {}
+    if key in cached:
+        return [StoreSite(*site) for site in cached[key]]
+
+    functions = symbols.load(path, cache_dir).functions()
+    sites = []
+    for start, code in executable_sections(path):
+        sites.extend(decode(code, start, target, width, functions))
+    cached[key] = [list(site) for site in sites]
+    symbols.write_json(cache_path, cached)
+    return sites
@@ -4,6 +4,7 @@ export GZ_SIM_RESOURCE_PATH=/app/resources/models
 
 FIRMWARE=$1
 CPV=$2 # the gdb script for a particular CPV
+MODE=${3:-realtime} # realtime, or lockstep to let the gdb script step the world
 # Name of the tmux session
 SESSION_NAME="emi"
 
@@ -17,11 +18,23 @@ tmux split-window -h
 
 tmux select-layout even-horizontal
 
-COMM1="gz sim -s -r -v4 default.sdf"
-COMM2="sleep 8 && firmware && gz topic -e -t /world/default/pose/info"
+# Wait for the world, the rover and qemu's gdb stub instead of sleeping a fixed time.
+WAIT_WORLD="until gz service -l | grep -q /world/default/create; do sleep 0.2; done"
+WAIT_ROVER="until gz model --list 2>/dev/null | grep -q r1_rover; do sleep 0.2; done"
+WAIT_GDB="until (exec 3<>/dev/tcp/localhost/1234) 2>/dev/null; do sleep 0.2; done"
+
+if [ "$MODE" = "lockstep" ]; then
+	# Gazebo starts paused; the gdb script advances it once per firmware loop.
+	COMM1="gz sim -s -v4 default.sdf"
+	GDB_ENV="SWAB_LOCKSTEP=1 SWAB_SCENARIO=$SWAB_SCENARIO"
+else
+	COMM1="gz sim -s -r -v4 default.sdf"
+	GDB_ENV="SWAB_LOCKSTEP=0 SWAB_SCENARIO=$SWAB_SCENARIO"
+fi
+COMM2="$WAIT_WORLD && firmware && gz topic -e -t /world/default/pose/info"
 COMM3="qemu-system-arm -machine lm3s6965evb -cpu cortex-m4 -nographic -kernel $FIRMWARE -D /user/data/new_qemu.log.1 -d int,cpu_reset,guest_errors,unimp -gdb tcp::1234 -S"
 # COMM4="gdb -q $FIRMWARE"
-COMM4="gdb -nw -q -x $CPV $FIRMWARE"
+COMM4="$WAIT_ROVER && $WAIT_GDB && $GDB_ENV gdb -nw -q -x $CPV $FIRMWARE"
 
 # Send commands to each pane
 tmux send-keys -t $SESSION_NAME:0.0 "$COMM1" C-m
@@ -2,12 +2,21 @@ from __future__ import annotations
 
 import abc
 import dataclasses as dc
+import enum
 import math
 import typing
 
+import history
+
 Position: typing.TypeAlias = tuple[float, float, float]
 Command = typing.Literal[55, 66]
 
+AUTODRIVE: typing.Final[int] = 0x01
+UPDATE_COMPASS: typing.Final[int] = 0x02
+UPDATE_GPS: typing.Final[int] = 0x04
+CHECK_POSITION: typing.Final[int] = 0x08
+MOVE: typing.Final[int] = 0x10
+
 
 @dc.dataclass(frozen=True, slots=True)
 class Flags:
@@ -19,6 +28,24 @@ class Flags:
     check_position: bool = dc.field(default=True)
     move: bool = dc.field(default=False)
 
+    @property
+    def bits(self) -> int:
+        """The flags packed into an int, one bit per flag."""
+
+        return (
+            (AUTODRIVE if self.autodrive else 0)
+            | (UPDATE_COMPASS if self.update_compass else 0)
+            | (UPDATE_GPS if self.update_gps else 0)
+            | (CHECK_POSITION if self.check_position else 0)
+            | (MOVE if self.move else 0)
+        )
+
+    @classmethod
+    def from_bits(cls, bits: int) -> Flags:
+        """The shared instance for the packed flags."""
+
+        return _FLAGS[bits]
+
 
 class Model(typing.Protocol):
     """Wrapper class to avoid setting rover properties unintentionally in states."""
@@ -56,6 +83,7 @@ class State(abc.ABC):
 
     model: Model
     flags: Flags
+    code: typing.ClassVar[int] = 0
     
     @abc.abstractmethod
     def next(self, cmd: Command | None) -> State:
@@ -89,6 +117,7 @@ class State(abc.ABC):
 
 @dc.dataclass(frozen=True, slots=True)
 class S1(State):
+    code: typing.ClassVar[int] = 1
     time: int
 
     def __post_init__(self):
@@ -117,6 +146,7 @@ def euclidean_distance(p1: Position, p2: Position) -> float:
 
 @dc.dataclass(frozen=True, slots=True)
 class S2(State):
+    code: typing.ClassVar[int] = 2
     initial_position: tuple[float, float, float] = dc.field()
 
     def __post_init__(self):
@@ -144,11 +174,12 @@ class S2(State):
                 initial_heading=self.model.heading,
             )
         
-        return S2(self.model, self.flags, self.initial_position)
+        return self
 
 
 @dc.dataclass(frozen=True, slots=True)
 class S3(State):
+    code: typing.ClassVar[int] = 3
     initial_heading: float = dc.field()
     
     def __post_init__(self):
@@ -175,11 +206,13 @@ class S3(State):
                 model=self.model,
             )
         
-        return S3(self.model, self.flags, self.initial_heading)
+        return self
 
 
 @dc.dataclass(frozen=True, slots=True)
 class S4(State):
+    code: typing.ClassVar[int] = 4
+
     def __post_init__(self):
         assert self.flags.autodrive
         assert self.flags.update_gps
@@ -201,6 +234,7 @@ class S4(State):
 
 @dc.dataclass(frozen=True, slots=True)
 class S5(State):
+    code: typing.ClassVar[int] = 5
     initial_position: Position
     
     def __post_init__(self):
@@ -224,11 +258,13 @@ class S5(State):
         if distance >= 7:
             return S6(flags=dc.replace(self.flags, autodrive=False, move=False), model=self.model)
 
-        return S5(self.model, self.flags, self.initial_position)
+        return self
 
 
 @dc.dataclass(frozen=True, slots=True)
 class S6(State):
+    code: typing.ClassVar[int] = 6
+
     def __post_init__(self):
         assert not self.flags.autodrive
         assert not self.flags.move
@@ -240,11 +276,13 @@ class S6(State):
         return True
 
     def next(self, cmd: Command | None) -> State:
-         return S6(self.model, self.flags)
+        return self
 
 
 @dc.dataclass(frozen=True, slots=True)
 class S7(State):
+    code: typing.ClassVar[int] = 7
+
     def __post_init__(self):
         assert self.flags.move
         assert not self.flags.autodrive
@@ -265,6 +303,8 @@ class S7(State):
 
 @dc.dataclass(frozen=True, slots=True)
 class S8(State):
+    code: typing.ClassVar[int] = 8
+
     def __post_init__(self):
         assert self.flags.update_compass
         assert not self.flags.autodrive
@@ -282,6 +322,8 @@ class S8(State):
 
 @dc.dataclass(frozen=True, slots=True)
 class S9(State):
+    code: typing.ClassVar[int] = 9
+
     def __post_init__(self):
         assert not self.flags.move
         assert not self.flags.update_compass
@@ -293,17 +335,258 @@ class S9(State):
         return True
 
     def next(self, cmd: Command | None) -> State:
-        return S9(self.model, self.flags)
+        return self
+
+
+STATES: dict[int, type[State]] = {state.code: state for state in (S1, S2, S3, S4, S5, S6, S7, S8, S9)}
+
+# Every state asserts all five flags in __post_init__, so each admits exactly one packed value.
+INVARIANTS: dict[int, int] = {
+    S1.code: CHECK_POSITION,
+    S2.code: AUTODRIVE | CHECK_POSITION,
+    S3.code: AUTODRIVE | UPDATE_COMPASS,
+    S4.code: AUTODRIVE | UPDATE_GPS,
+    S5.code: AUTODRIVE | MOVE,
+    S6.code: 0,
+    S7.code: MOVE,
+    S8.code: UPDATE_COMPASS,
+    S9.code: 0,
+}
+
+_FLAGS: tuple[Flags, ...] = tuple(
+    Flags(
+        autodrive=bool(bits & AUTODRIVE),
+        update_compass=bool(bits & UPDATE_COMPASS),
+        update_gps=bool(bits & UPDATE_GPS),
+        check_position=bool(bits & CHECK_POSITION),
+        move=bool(bits & MOVE),
+    )
+    for bits in range(32)
+)
+
+
+def _record(state: State) -> history.Record:
+    return (
+        state.code,
+        state.flags.bits,
+        getattr(state, "time", 0),
+        getattr(state, "initial_position", (0.0, 0.0, 0.0)),
+        getattr(state, "initial_heading", 0.0),
+    )
+
+
+def _materialize(model: Model, record: history.Record) -> State:
+    code, bits, time, position, heading = record
+    flags = Flags.from_bits(bits)
+
+    if code == S1.code:
+        return S1(model, flags, time=time)
+
+    if code in (S2.code, S5.code):
+        return STATES[code](model, flags, position)
+
+    if code == S3.code:
+        return S3(model, flags, heading)
+
+    return STATES[code](model, flags)
 
 
 class Automaton:
-    def __init__(self, vehicle: Vehicle):
+    """Steps the vehicle through the S1..S9 states.
+
+    Past states are kept in ``recorder`` as compact records without model references; by default
+    every step is kept, run-length encoded. ``history`` rebuilds the retained states.
+    """
+
+    def __init__(self, vehicle: Vehicle, *, recorder: history.StateHistory | None = None):
         self.vehicle = vehicle
         self.state: State = S1(flags=Flags(), model=vehicle, time=0)
-        self.history: list[State] = []
+        self.recorder = recorder if recorder is not None else history.StateHistory()
+
+    @property
+    def history(self) -> list[State]:
+        return [_materialize(self.vehicle, record) for record in self.recorder]
+
+    @property
+    def code(self) -> int:
+        return self.state.code
+
+    def is_terminal(self) -> bool:
+        return self.state.is_terminal()
+
+    def reset(self):
+        """Return to the initial state and start a new history, keeping the vehicle."""
+
+        self.state = S1(flags=Flags(), model=self.vehicle, time=0)
+        self.recorder.clear()
 
     def step(self, cmd: Command | None):
-        self.history.append(self.state)
+        self.recorder.append(_record(self.state))
         self.state = self.state.next(cmd)
         self.vehicle.velocity = self.state.velocity
         self.vehicle.omega = self.state.omega
+
+
+class Capture(enum.Enum):
+    POSITION = enum.auto()
+    HEADING = enum.auto()
+
+
+class Transition(typing.NamedTuple):
+    """Edge of the compact automaton, taken when cmd matches ``command`` (if given) and ``guard``
+    (if given) holds. The flags become ``(bits & ~clear) | set``."""
+
+    target: int
+    command: Command | None = None
+    guard: typing.Callable[[CompactAutomaton], bool] | None = None
+    set: int = 0
+    clear: int = 0
+    capture: Capture | None = None
+
+
+def _waited(automaton: CompactAutomaton) -> bool:
+    return automaton.time >= 5
+
+
+def _moved(automaton: CompactAutomaton) -> bool:
+    return euclidean_distance(automaton.vehicle.position, automaton.initial_position) >= 7
+
+
+def _turned(automaton: CompactAutomaton) -> bool:
+    return math.fabs(automaton.vehicle.heading - automaton.initial_heading) >= 70
+
+
+# The edges of each state in the order its next() checks them. No match keeps the state.
+TRANSITIONS: dict[int, tuple[Transition, ...]] = {
+    S1.code: (Transition(S2.code, guard=_waited, set=AUTODRIVE, capture=Capture.POSITION),),
+    S2.code: (
+        Transition(S6.code, command=66, clear=AUTODRIVE | CHECK_POSITION),
+        Transition(S3.code, guard=_moved, set=UPDATE_COMPASS, clear=CHECK_POSITION, capture=Capture.HEADING),
+    ),
+    S3.code: (
+        Transition(S8.code, command=66, clear=AUTODRIVE | CHECK_POSITION),
+        Transition(S4.code, guard=_turned, set=UPDATE_GPS, clear=UPDATE_COMPASS),
+    ),
+    S4.code: (Transition(S5.code, set=MOVE, clear=UPDATE_GPS, capture=Capture.POSITION),),
+    S5.code: (
+        Transition(S7.code, command=66, clear=AUTODRIVE | CHECK_POSITION),
+        Transition(S6.code, guard=_moved, clear=AUTODRIVE | MOVE),
+    ),
+    S6.code: (),
+    S7.code: (
+        Transition(S9.code, command=55),
+        Transition(S6.code, clear=MOVE),
+    ),
+    S8.code: (Transition(S7.code, set=MOVE, clear=UPDATE_COMPASS),),
+    S9.code: (),
+}
+
+_VELOCITY: dict[int, float] = {code: 1.0 if code in (S2.code, S5.code, S7.code) else 0.0 for code in STATES}
+_OMEGA: dict[int, float] = {code: 1.0 if code in (S3.code, S4.code, S8.code) else 0.0 for code in STATES}
+_TERMINAL: frozenset[int] = frozenset((S6.code, S9.code))
+
+
+class CompactAutomaton:
+    """Automaton that keeps its state as a code, packed flags and the few values the guards use.
+
+    A step looks up the transitions of the current code in ``TRANSITIONS`` instead of constructing
+    a state object, and a step that does not change state allocates nothing. ``state`` and
+    ``history`` still return the S1..S9 objects, built on access from the compact records. The flag invariants that the
+    state classes assert are checked after every transition unless ``check_invariants`` is false,
+    which defaults to following ``assert`` under ``python -O``.
+    """
+
+    def __init__(
+        self,
+        vehicle: Vehicle,
+        *,
+        check_invariants: bool = __debug__,
+        recorder: history.StateHistory | None = None,
+    ):
+        self.vehicle = vehicle
+        self.check_invariants = check_invariants
+        self.recorder = recorder if recorder is not None else history.StateHistory()
+        self.reset()
+
+    def reset(self):
+        self.code = S1.code
+        self.bits = CHECK_POSITION
+        self.time = 0
+        self.initial_position: Position = (0.0, 0.0, 0.0)
+        self.initial_heading = 0.0
+        self._record = self._pack()
+        self.recorder.clear()
+
+    def is_terminal(self) -> bool:
+        return self.code in _TERMINAL
+
+    @property
+    def flags(self) -> Flags:
+        return Flags.from_bits(self.bits)
+
+    @property
+    def state(self) -> State:
+        return _materialize(self.vehicle, self._record)
+
+    @property
+    def history(self) -> list[State]:
+        return [_materialize(self.vehicle, record) for record in self.recorder]
+
+    def step(self, cmd: Command | None):
+        # Steps that keep the state share one record, so recording it only extends the current run.
+        self.recorder.append(self._record)
+
+        for transition in TRANSITIONS[self.code]:
+            command = transition.command
+            guard = transition.guard
+
+            if (command is None or command == cmd) and (guard is None or guard(self)):
+                self._enter(transition)
+                return
+
+        if self.code == S1.code:
+            self.time += 1
+            self._record = self._pack()
+
+    def _pack(self) -> history.Record:
+        # Only the field the current state class has is kept, so records match _record(state).
+        code = self.code
+
+        return (
+            code,
+            self.bits,
+            self.time if code == S1.code else 0,
+            self.initial_position if code in (S2.code, S5.code) else (0.0, 0.0, 0.0),
+            self.initial_heading if code == S3.code else 0.0,
+        )
+
+    def _enter(self, transition: Transition):
+        bits = (self.bits & ~transition.clear) | transition.set
+
+        if self.check_invariants and bits != INVARIANTS[transition.target]:
+            raise AssertionError(f"Invalid flags {Flags.from_bits(bits)} entering {STATES[transition.target].__name__}")
+
+        if transition.capture is Capture.POSITION:
+            self.initial_position = self.vehicle.position
+        elif transition.capture is Capture.HEADING:
+            self.initial_heading = self.vehicle.heading
+
+        self.code = transition.target
+        self.bits = bits
+        self._record = self._pack()
+        # The vehicle setters ignore unchanged targets, so they only need calling on a transition.
+        self.vehicle.velocity = _VELOCITY[self.code]
+        self.vehicle.omega = _OMEGA[self.code]
+
+
+def create(
+    vehicle: Vehicle,
+    *,
+    compact: bool = False,
+    check_invariants: bool = __debug__,
+    recorder: history.StateHistory | None = None,
+) -> Automaton | CompactAutomaton:
+    if compact:
+        return CompactAutomaton(vehicle, check_invariants=check_invariants, recorder=recorder)
+
+    return Automaton(vehicle, recorder=recorder)
@@ -0,0 +1,339 @@
+"""Vectorised automaton and kinematic vehicle for evaluating many scenarios at once.
+
+``BatchAutomaton`` holds N copies of ``automaton.Automaton`` as NumPy arrays: the state code, the
+``automaton.Flags`` packed into bits, the S1 time counter and the initial position and heading
+captured on entering S2, S3 and S5. Every tick computes all transitions with boolean masks and
+reproduces the per-object semantics, including the flag assertions of each state. ``BatchVehicle``
+does the same for the models in ``kinematic``, so a sweep over thousands of command and magnet
+scenarios runs as a few array operations per tick.
+"""
+
+from __future__ import annotations
+
+import itertools
+import math
+import typing
+from array import array
+from dataclasses import dataclass, field
+
+import numpy as np
+
+import automaton
+import kinematic
+import messages
+from automaton import AUTODRIVE, CHECK_POSITION, MOVE, UPDATE_COMPASS, UPDATE_GPS
+
+NO_COMMAND: typing.Final[int] = 0
+
+_EXPECTED_FLAGS = np.zeros(max(automaton.STATES) + 1, dtype=np.uint8)
+_EXPECTED_FLAGS[list(automaton.INVARIANTS)] = list(automaton.INVARIANTS.values())
+
+_VELOCITY = np.zeros(len(_EXPECTED_FLAGS))
+_VELOCITY[[2, 5, 7]] = 1.0
+_OMEGA = np.zeros(len(_EXPECTED_FLAGS))
+_OMEGA[[3, 4, 8]] = 1.0
+_TERMINAL = np.zeros(len(_EXPECTED_FLAGS), dtype=bool)
+_TERMINAL[[6, 9]] = True
+
+
+def _clear(bits: int) -> np.uint8:
+    return np.uint8(0xFF ^ bits)
+
+
+class BatchAutomaton:
+    """N automata stepped together.
+
+    A transition into a state whose flag assertions fail raises ``AssertionError``, as constructing
+    the state dataclass would. With ``strict=False`` the offending automata are marked in ``failed``
+    instead and frozen in their last valid state, so one bad scenario does not end the whole sweep.
+    """
+
+    def __init__(self, n: int, *, strict: bool = True):
+        self.n = n
+        self.strict = strict
+        self.state = np.full(n, automaton.S1.code, dtype=np.uint8)
+        self.flags = np.full(n, CHECK_POSITION, dtype=np.uint8)
+        self.time = np.zeros(n, dtype=np.int64)
+        self.initial_position = np.zeros((n, 3))
+        self.initial_heading = np.zeros(n)
+        self.failed = np.zeros(n, dtype=bool)
+
+    @property
+    def velocity(self) -> np.ndarray:
+        return _VELOCITY[self.state]
+
+    @property
+    def omega(self) -> np.ndarray:
+        return _OMEGA[self.state]
+
+    @property
+    def terminal(self) -> np.ndarray:
+        return _TERMINAL[self.state]
+
+    @property
+    def done(self) -> np.ndarray:
+        return self.terminal | self.failed
+
+    def step(self, cmds: np.ndarray, positions: np.ndarray, headings: np.ndarray):
+        """Advance every automaton, given its command (0 for none) and its vehicle's current pose."""
+
+        state = self.state
+        flags = self.flags
+        next_state = state.copy()
+        next_flags = flags.copy()
+
+        cmd55 = cmds == 55
+        cmd66 = cmds == 66
+        moved = np.linalg.norm(positions - self.initial_position, axis=1) >= 7
+        turned = np.abs(headings - self.initial_heading) >= 70
+
+        s1 = state == 1
+        s1_go = s1 & (self.time >= 5)
+        s2_stop = (state == 2) & cmd66
+        s2_go = (state == 2) & ~cmd66 & moved
+        s3_stop = (state == 3) & cmd66
+        s3_go = (state == 3) & ~cmd66 & turned
+        s4 = state == 4
+        s5_stop = (state == 5) & cmd66
+        s5_go = (state == 5) & ~cmd66 & moved
+        s7_go = (state == 7) & cmd55
+        s7_stop = (state == 7) & ~cmd55
+        s8 = state == 8
+
+        self.time[s1 & ~s1_go] += 1
+
+        next_state[s1_go] = 2
+        next_flags[s1_go] |= AUTODRIVE
+
+        next_state[s2_stop] = 6
+        next_flags[s2_stop] &= _clear(AUTODRIVE | CHECK_POSITION)
+        next_state[s2_go] = 3
+        next_flags[s2_go] = (next_flags[s2_go] & _clear(CHECK_POSITION)) | UPDATE_COMPASS
+
+        next_state[s3_stop] = 8
+        next_flags[s3_stop] &= _clear(AUTODRIVE | CHECK_POSITION)
+        next_state[s3_go] = 4
+        next_flags[s3_go] = (next_flags[s3_go] & _clear(UPDATE_COMPASS)) | UPDATE_GPS
+
+        next_state[s4] = 5
+        next_flags[s4] = (next_flags[s4] & _clear(UPDATE_GPS)) | MOVE
+
+        next_state[s5_stop] = 7
+        next_flags[s5_stop] &= _clear(AUTODRIVE | CHECK_POSITION)
+        next_state[s5_go] = 6
+        next_flags[s5_go] &= _clear(AUTODRIVE | MOVE)
+
+        next_state[s7_go] = 9
+        next_state[s7_stop] = 6
+        next_flags[s7_stop] &= _clear(MOVE)
+
+        next_state[s8] = 7
+        next_flags[s8] = (next_flags[s8] & _clear(UPDATE_COMPASS)) | MOVE
+
+        invalid = ~self.failed & (next_flags != _EXPECTED_FLAGS[next_state])
+
+        if invalid.any():
+            if self.strict:
+                indices = np.flatnonzero(invalid).tolist()
+                raise AssertionError(f"Invalid flags entering states {next_state[invalid].tolist()} for automata {indices}")
+
+            self.failed |= invalid
+
+        active = ~self.failed
+        entered = active & (s1_go | s4)
+        self.initial_position[entered] = positions[entered]
+        self.initial_heading[active & s2_go] = headings[active & s2_go]
+        self.state = np.where(active, next_state, state)
+        self.flags = np.where(active, next_flags, flags)
+
+    def flags_of(self, index: int) -> automaton.Flags:
+        return automaton.Flags.from_bits(int(self.flags[index]))
+
+
+@dataclass()
+class BatchVehicle:
+    """N ``kinematic`` vehicles of one model, integrated together.
+
+    Magnets are limited to stationary ones, given as one heading offset in degrees per vehicle.
+    """
+
+    n: int = field()
+    backend: str = field(default="differential")
+    offsets: np.ndarray | None = field(default=None)
+    wheel_radius: float = field(default=0.1)
+    track: float = field(default=0.5)
+    wheelbase: float = field(default=0.4)
+    max_steer: float = field(default=math.radians(30))
+    min_speed: float = field(default=0.05)
+
+    def __post_init__(self):
+        if self.backend not in kinematic.BACKENDS:
+            raise kinematic.KinematicError(f"Unknown kinematic backend {self.backend!r}")
+
+        self.offsets = np.zeros(self.n) if self.offsets is None else np.asarray(self.offsets, dtype=float)
+        self.clock = 0.0
+        self.x = np.zeros(self.n)
+        self.y = np.zeros(self.n)
+        self.yaw = np.zeros(self.n)
+        self.left = np.zeros(self.n)
+        self.right = np.zeros(self.n)
+        self.velocity = np.zeros(self.n)
+        self.omega = np.zeros(self.n)
+
+    @property
+    def positions(self) -> np.ndarray:
+        return np.stack((self.x, self.y, np.zeros(self.n)), axis=1)
+
+    @property
+    def headings(self) -> np.ndarray:
+        return np.degrees(self.yaw) + self.offsets
+
+    def command(self, velocity: np.ndarray, omega: np.ndarray):
+        """Drive the wheels at the sum of the velocity and omega targets."""
+
+        self.velocity = velocity.copy()
+        self.omega = omega.copy()
+        self.left = omega - velocity
+        self.right = velocity + omega
+
+    def rates(self) -> tuple[np.ndarray, np.ndarray]:
+        left = -self.left * self.wheel_radius
+        right = self.right * self.wheel_radius
+        speed = (left + right) / 2
+        yaw_rate = (right - left) / self.track
+
+        if self.backend == "ackermann":
+            creep = (yaw_rate != 0) & (np.abs(speed) < self.min_speed)
+            speed = np.where(creep, np.where(speed >= 0, self.min_speed, -self.min_speed), speed)
+            limit = np.abs(speed) * math.tan(self.max_steer) / self.wheelbase
+            yaw_rate = np.clip(yaw_rate, -limit, limit)
+
+        return speed, yaw_rate
+
+    def advance(self, dt: float):
+        speed, yaw_rate = self.rates()
+        yaw = self.yaw + yaw_rate * dt
+        arc = np.abs(yaw_rate * dt) > 1e-9
+        radius = np.divide(speed, yaw_rate, out=np.zeros(self.n), where=arc)
+
+        self.x = np.where(arc, self.x + radius * (np.sin(yaw) - np.sin(self.yaw)), self.x + speed * np.cos(self.yaw) * dt)
+        self.y = np.where(arc, self.y - radius * (np.cos(yaw) - np.cos(self.yaw)), self.y + speed * np.sin(self.yaw) * dt)
+        self.yaw = np.remainder(yaw + math.pi, math.tau) - math.pi
+        self.clock += dt
+
+
+@dataclass()
+class BatchTrace:
+    """Recorded updates of a batch run; per-vehicle arrays have one column per scenario."""
+
+    time: np.ndarray = field()
+    x: np.ndarray = field()
+    y: np.ndarray = field()
+    heading: np.ndarray = field()
+    states: np.ndarray = field()
+    lengths: np.ndarray = field()
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def trace(self, index: int) -> messages.Trace:
+        """The trace the per-object simulation would have produced for one scenario."""
+
+        length = int(self.lengths[index])
+        zeros = array("d", bytes(8 * length))
+        columns = {
+            "time": array("d", self.time[:length].tobytes()),
+            "x": array("d", np.ascontiguousarray(self.x[:length, index]).tobytes()),
+            "y": array("d", np.ascontiguousarray(self.y[:length, index]).tobytes()),
+            "z": zeros,
+            "heading": array("d", np.ascontiguousarray(self.heading[:length, index]).tobytes()),
+            "roll": array("d", zeros),
+        }
+
+        return messages.Trace(columns, array("B", self.states[:length, index].tobytes()))
+
+
+def simulate(
+    vehicle: BatchVehicle,
+    controller: BatchAutomaton,
+    frequency: int,
+    commands: np.ndarray | None = None,
+    *,
+    dt: float | None = None,
+    max_time: float = 300.0,
+) -> BatchTrace:
+    """Vectorised ``kinematic.simulate``. commands holds one row of command codes per scenario.
+
+    A scenario's trace ends at its first terminal state or, outside strict mode, at the last valid
+    state before a failed assertion.
+    """
+
+    period = 1 / frequency
+
+    if dt is None:
+        dt = period
+
+    if dt <= 0 or dt > period:
+        raise kinematic.KinematicError("Integration step must be positive and no longer than the update period")
+
+    n = controller.n
+    substeps = max(1, round(period / dt))
+    step = 1 / (frequency * substeps)
+    updates = math.floor(max_time * frequency)
+
+    if commands is None:
+        commands = np.full((n, updates), NO_COMMAND, dtype=np.uint8)
+    elif commands.shape[0] != n or commands.shape[1] < updates:
+        raise ValueError(f"Expected commands of shape ({n}, >={updates}), received {commands.shape}")
+
+    time = np.empty(updates + 1)
+    x = np.empty((updates + 1, n))
+    y = np.empty((updates + 1, n))
+    heading = np.empty((updates + 1, n))
+    states = np.empty((updates + 1, n), dtype=np.uint8)
+    lengths = np.zeros(n, dtype=np.int64)
+    running = np.ones(n, dtype=bool)
+
+    for update in itertools.count():
+        time[update] = vehicle.clock
+        x[update] = vehicle.x
+        y[update] = vehicle.y
+        heading[update] = vehicle.headings
+        states[update] = controller.state
+        lengths[running] = update + 1
+        running &= ~controller.terminal
+
+        if update >= updates or not running.any():
+            break
+
+        controller.step(commands[:, update], vehicle.positions, vehicle.headings)
+        running &= ~controller.failed
+        vehicle.command(controller.velocity, controller.omega)
+
+        for _ in range(substeps):
+            vehicle.advance(step)
+
+    stop = update + 1
+    return BatchTrace(time[:stop], x[:stop], y[:stop], heading[:stop], states[:stop], lengths)
+
+
+def run(
+    commands: np.ndarray | None,
+    offsets: np.ndarray | None = None,
+    *,
+    n: int | None = None,
+    backend: str = "differential",
+    frequency: int = 1,
+    dt: float | None = None,
+    max_time: float = 300.0,
+    strict: bool = True,
+) -> BatchTrace:
+    """Simulate one scenario per row of commands, each with a stationary magnet offset in degrees."""
+
+    if n is None:
+        n = len(commands) if commands is not None else len(offsets) if offsets is not None else 1
+
+    vehicle = BatchVehicle(n, backend, offsets)
+    controller = BatchAutomaton(n, strict=strict)
+
+    return simulate(vehicle, controller, frequency, commands, dt=dt, max_time=max_time)
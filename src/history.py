@@ -0,0 +1,207 @@
+"""Bounded, run-length encoded recorder for automaton state histories.
+
+States are recorded as plain tuples ``(code, flags, time, initial_position, initial_heading)``
+holding no model references. Consecutive identical records collapse into one run, since states such
+as S2, S3 and S5 repeat for many ticks. At most ``capacity`` runs are kept in memory, and completed
+runs can also be appended to a memory-mapped spill file that keeps the whole history on disk. The
+spill file outlives ``clear``: every cleared history is kept there as its own segment.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import typing
+from collections import deque
+from collections.abc import Iterator
+from pathlib import Path
+
+Position: typing.TypeAlias = tuple[float, float, float]
+Record: typing.TypeAlias = tuple[int, int, int, Position, float]
+
+MAGIC: typing.Final[bytes] = b"SWAH"
+VERSION: typing.Final[int] = 2
+
+# magic, version, number of entries
+HEADER = struct.Struct("<4sIQ")
+# code, flags, time, initial position, initial heading, count
+RUN = struct.Struct("<BBxxI4dQ")
+# An entry with this code ends a segment; automaton state codes start at 1.
+SEGMENT_END: typing.Final[int] = 0
+
+_GROWTH: typing.Final[int] = 1 << 20
+
+
+class HistoryError(Exception):
+    pass
+
+
+class SpillFile:
+    """Append-only file of runs, written through a memory map grown in fixed steps."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        self._size = 0
+        self._map: mmap.mmap | None = None
+        self.runs = 0
+        self._grow(HEADER.size + _GROWTH)
+        self._write_header()
+
+    def _grow(self, size: int):
+        if self._map is not None:
+            self._map.close()
+
+        os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        self._size = size
+
+    def _write_header(self):
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, self.runs)
+
+    def _offset(self, index: int) -> int:
+        return HEADER.size + index * RUN.size
+
+    def write(self, record: Record, count: int, *, complete: bool = True):
+        """Write a run after the complete ones. An incomplete run is overwritten by the next write."""
+
+        offset = self._offset(self.runs)
+
+        if offset + RUN.size > self._size:
+            self._grow(self._size + _GROWTH)
+
+        code, flags, time, position, heading = record
+        RUN.pack_into(self._map, offset, code, flags, time, *position, heading, count)
+
+        if complete:
+            self.runs += 1
+            self._write_header()
+        else:
+            HEADER.pack_into(self._map, 0, MAGIC, VERSION, self.runs + 1)
+
+    def end_segment(self):
+        self.write((SEGMENT_END, 0, 0, (0.0, 0.0, 0.0), 0.0), 0)
+
+    def flush(self):
+        self._map.flush()
+
+    def close(self):
+        if self._map is not None:
+            self._map.flush()
+            self._map.close()
+            self._map = None
+            os.close(self._fd)
+
+
+def read_segments(path: Path) -> Iterator[list[tuple[Record, int]]]:
+    """Yield the segments of a spill file, one per cleared history, as lists of ``(record, count)``."""
+
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    with data:
+        magic, version, runs = HEADER.unpack_from(data, 0)
+
+        if magic != MAGIC:
+            raise HistoryError(f"{path} is not a history spill file")
+
+        if version != VERSION:
+            raise HistoryError(f"Unsupported history spill version {version}")
+
+        segment = []
+
+        for index in range(runs):
+            code, flags, time, x, y, z, heading, count = RUN.unpack_from(data, HEADER.size + index * RUN.size)
+
+            if code == SEGMENT_END:
+                yield segment
+                segment = []
+            else:
+                segment.append(((code, flags, time, (x, y, z), heading), count))
+
+        if segment:
+            yield segment
+
+
+def read_spill(path: Path) -> Iterator[tuple[Record, int]]:
+    """Yield the runs of every segment of a spill file as ``(record, count)`` pairs."""
+
+    for segment in read_segments(path):
+        yield from segment
+
+
+class StateHistory:
+    """Recorder of automaton states with run-length encoding and bounded retention.
+
+    ``capacity`` limits the runs kept in memory (None keeps all of them). Older runs are dropped,
+    or only left in the spill file if ``spill`` is given. ``len`` counts every recorded step, and
+    iterating yields the retained steps oldest first.
+    """
+
+    def __init__(self, capacity: int | None = None, spill: Path | None = None):
+        if capacity is not None and capacity < 1:
+            raise HistoryError("History capacity must be at least one run")
+
+        self.capacity = capacity
+        self._runs: deque[list] = deque(maxlen=capacity)
+        self._spill = SpillFile(spill) if spill is not None else None
+        self._steps = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return self._steps
+
+    def __iter__(self) -> Iterator[Record]:
+        for record, count in self._runs:
+            for _ in range(count):
+                yield record
+
+    def append(self, record: Record):
+        self._steps += 1
+        runs = self._runs
+
+        if runs and runs[-1][0] == record:
+            runs[-1][1] += 1
+            return
+
+        if runs:
+            last, count = runs[-1]
+
+            if self._spill is not None:
+                self._spill.write(last, count)
+
+            if len(runs) == self.capacity:
+                self.dropped += runs[0][1]
+
+        runs.append([record, 1])
+
+    def runs(self) -> list[tuple[Record, int]]:
+        """The retained runs as ``(record, count)`` pairs."""
+
+        return [(record, count) for record, count in self._runs]
+
+    def clear(self):
+        """Forget the history in memory. The spill file keeps it and starts a new segment."""
+
+        if self._spill is not None and self._runs:
+            record, count = self._runs[-1]
+            self._spill.write(record, count)
+            self._spill.end_segment()
+
+        self._runs.clear()
+        self._steps = 0
+        self.dropped = 0
+
+    def flush(self):
+        """Make the spill file hold the whole history, including the run still being extended."""
+
+        if self._spill is not None and self._runs:
+            record, count = self._runs[-1]
+            self._spill.write(record, count, complete=False)
+            self._spill.flush()
+
+    def close(self):
+        if self._spill is not None:
+            self.flush()
+            self._spill.close()
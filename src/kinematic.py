@@ -0,0 +1,236 @@
+"""Headless kinematic vehicle models for running the automaton without Gazebo.
+
+The vehicles implement ``automaton.Vehicle`` and integrate their pose in fixed time steps of
+simulated time, so a whole run takes as long as the arithmetic and nothing else. They are meant for
+screening samples cheaply before running the interesting ones against the full simulation.
+"""
+
+from __future__ import annotations
+
+import abc
+import itertools
+import math
+import typing
+from dataclasses import dataclass, field
+
+import attack
+import automaton
+import messages
+
+BACKENDS: typing.Final[tuple[str, ...]] = ("differential", "ackermann")
+
+
+@dataclass()
+class KinematicVehicle(automaton.Vehicle, abc.ABC):
+    """Planar vehicle driven by the wheel speeds the rover's motor topic would receive.
+
+    Commands follow ``rover.Rover``: velocity drives the wheels at ``(-v, v)`` and omega at
+    ``(w, w)``, the left joint being mounted in reverse, and the two are added. The reported heading
+    includes the magnet's compass offset.
+    """
+
+    magnet: attack.Magnet = field(default_factory=lambda: attack.StationaryMagnet(0.0))
+    wheel_radius: float = field(default=0.1)
+    track: float = field(default=0.5)
+    _clock: float = field(default=0.0, init=False)
+    _x: float = field(default=0.0, init=False)
+    _y: float = field(default=0.0, init=False)
+    _yaw: float = field(default=0.0, init=False)
+    _left: float = field(default=0.0, init=False)
+    _right: float = field(default=0.0, init=False)
+    _velocity: float = field(default=0.0, init=False)
+    _omega: float = field(default=0.0, init=False)
+
+    @abc.abstractmethod
+    def rates(self) -> tuple[float, float]:
+        """Forward speed in m/s and yaw rate in rad/s for the current wheel speeds."""
+
+        ...
+
+    def advance(self, dt: float):
+        """Integrate the pose over dt seconds of simulated time at constant wheel speeds."""
+
+        speed, yaw_rate = self.rates()
+        yaw = self._yaw + yaw_rate * dt
+
+        if yaw_rate and abs(yaw_rate * dt) > 1e-9:
+            # Exact arc, so the result does not depend on the step size while the wheels are steady.
+            radius = speed / yaw_rate
+            self._x += radius * (math.sin(yaw) - math.sin(self._yaw))
+            self._y -= radius * (math.cos(yaw) - math.cos(self._yaw))
+        else:
+            self._x += speed * math.cos(self._yaw) * dt
+            self._y += speed * math.sin(self._yaw) * dt
+
+        self._yaw = math.remainder(yaw, math.tau)
+        self._clock += dt
+
+    @property
+    def clock(self) -> float:
+        return self._clock
+
+    @property
+    def position(self) -> tuple[float, float, float]:
+        return (self._x, self._y, 0.0)
+
+    @property
+    def heading(self) -> float:
+        return math.degrees(self._yaw) + self.magnet.offset(self._clock)
+
+    @property
+    def roll(self) -> float:
+        return 0.0
+
+    @property
+    def omega(self) -> float:
+        return self._omega
+
+    @omega.setter
+    def omega(self, target: float):
+        self._omega = target
+        self._left, self._right = target - self._velocity, self._velocity + target
+
+    @property
+    def velocity(self) -> float:
+        return self._velocity
+
+    @velocity.setter
+    def velocity(self, target: float):
+        self._velocity = target
+        self._left, self._right = self._omega - target, target + self._omega
+
+    def _wheel_speeds(self) -> tuple[float, float]:
+        """Forward ground speed of the left and right wheels."""
+
+        return (-self._left * self.wheel_radius, self._right * self.wheel_radius)
+
+
+@dataclass()
+class DifferentialDrive(KinematicVehicle):
+    """Skid-steered vehicle that turns on the spot when its wheels spin in opposite directions."""
+
+    def rates(self) -> tuple[float, float]:
+        left, right = self._wheel_speeds()
+        return ((left + right) / 2, (right - left) / self.track)
+
+
+@dataclass()
+class Ackermann(KinematicVehicle):
+    """Front-steered vehicle; the wheel speed difference requests a yaw rate the steering can limit.
+
+    The yaw rate is bounded by the forward speed and the maximum steering angle, so unlike
+    ``DifferentialDrive`` it cannot turn without moving. A turn requested while (nearly) stopped,
+    as the automaton does in S3, creeps forward at ``min_speed`` instead of never turning.
+    """
+
+    wheelbase: float = field(default=0.4)
+    max_steer: float = field(default=math.radians(30))
+    min_speed: float = field(default=0.05)
+
+    def rates(self) -> tuple[float, float]:
+        left, right = self._wheel_speeds()
+        speed = (left + right) / 2
+        yaw_rate = (right - left) / self.track
+
+        if yaw_rate and abs(speed) < self.min_speed:
+            speed = self.min_speed if speed >= 0 else -self.min_speed
+
+        limit = abs(speed) * math.tan(self.max_steer) / self.wheelbase
+
+        return (speed, max(-limit, min(limit, yaw_rate)))
+
+
+class KinematicError(Exception):
+    pass
+
+
+def create(backend: str, magnet: attack.Magnet | None = None) -> KinematicVehicle:
+    if magnet is None:
+        magnet = attack.StationaryMagnet(0.0)
+
+    if backend == "differential":
+        return DifferentialDrive(magnet)
+
+    if backend == "ackermann":
+        return Ackermann(magnet)
+
+    raise KinematicError(f"Unknown kinematic backend {backend!r}")
+
+
+def simulate(
+    vehicle: KinematicVehicle,
+    controller: automaton.Automaton | automaton.CompactAutomaton,
+    frequency: int,
+    msg: messages.Start,
+    *,
+    dt: float | None = None,
+    max_time: float = 300.0,
+    require_terminal: bool = False,
+) -> messages.Trace:
+    """Run the controller at frequency Hz of simulated time, integrating the vehicle every dt seconds.
+
+    Mirrors ``publisher.simulate``: the pose and state are recorded on every controller update, and
+    the run ends at a terminal state or once max_time seconds have been simulated. Wheel speeds only
+    change on updates and ``advance`` follows the exact arc, so by default each update period is
+    integrated in a single step. With require_terminal, reaching max_time raises ``KinematicError``.
+    """
+
+    period = 1 / frequency
+
+    if dt is None:
+        dt = period
+
+    if dt <= 0 or dt > period:
+        raise KinematicError("Integration step must be positive and no longer than the update period")
+
+    cmds = iter(msg.commands)
+    substeps = max(1, round(period / dt))
+    step = 1 / (frequency * substeps)
+    updates = math.floor(max_time * frequency)
+    history = messages.Trace()
+
+    for update in itertools.count():
+        history.append(vehicle.clock, vehicle.position, vehicle.heading, vehicle.roll, controller.code)
+
+        if controller.is_terminal():
+            return history
+
+        if update >= updates:
+            if require_terminal:
+                raise KinematicError(f"Controller still in S{controller.code} after {max_time} s of simulated time")
+
+            return history
+
+        controller.step(next(cmds))
+
+        for _ in range(substeps):
+            vehicle.advance(step)
+
+
+def run(
+    msg: messages.Start,
+    *,
+    backend: str = "differential",
+    frequency: int = 1,
+    dt: float | None = None,
+    max_time: float = 300.0,
+    compact: bool = False,
+    require_terminal: bool = False,
+) -> messages.Trace:
+    vehicle = create(backend, msg.magnet)
+    controller = automaton.create(vehicle, compact=compact)
+
+    return simulate(vehicle, controller, frequency, msg, dt=dt, max_time=max_time, require_terminal=require_terminal)
+
+
+def check():
+    """Run the automaton without commands or attack on every backend and require it to finish."""
+
+    for backend in BACKENDS:
+        msg = messages.Start(commands=itertools.repeat(None), magnet=None)
+        trace = run(msg, backend=backend, require_terminal=True)
+        print(f"{backend}: S{trace.states[-1]} after {trace.columns['time'][-1]:.0f} s")
+
+
+if __name__ == "__main__":
+    check()
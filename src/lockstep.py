@@ -0,0 +1,148 @@
+"""Simulation time sources and lock-step control of a Gazebo world.
+
+A ``Lockstep`` pauses the world and advances it by explicit numbers of physics iterations through
+the world control service, so whoever drives it decides when simulation time passes.
+"""
+
+from __future__ import annotations
+
+import typing
+from threading import Condition
+
+from gz.msgs10.boolean_pb2 import Boolean
+from gz.msgs10.clock_pb2 import Clock
+from gz.msgs10.physics_pb2 import Physics
+from gz.msgs10.world_control_pb2 import WorldControl
+from gz.transport13 import Node
+
+if typing.TYPE_CHECKING:
+    import rover
+
+DEFAULT_STEP_SIZE: typing.Final[float] = 0.001
+
+# Stamps are built from sec + nsec and ticks from repeated float sums, so compare with some slack.
+TOLERANCE: typing.Final[float] = 1e-6
+
+
+class LockstepError(Exception):
+    pass
+
+
+class SimClock(typing.Protocol):
+    def now(self) -> float:
+        ...
+
+    def wait_until(self, clock: float, timeout: float | None = None) -> bool:
+        ...
+
+    def close(self):
+        ...
+
+
+class PoseClock:
+    """Simulation time of the latest pose message, from a ``rover.Rover`` or ``rover.PoseHandler``."""
+
+    def __init__(self, vehicle: rover.Rover | rover.PoseHandler):
+        self._vehicle = vehicle
+
+    def now(self) -> float:
+        return self._vehicle.clock
+
+    def wait_until(self, clock: float, timeout: float | None = None) -> bool:
+        return self._vehicle.wait_for_clock(clock, timeout)
+
+    def close(self):
+        pass
+
+
+class TopicClock:
+    """Simulation time published on the world's clock topic."""
+
+    def __init__(self, node: Node, world: str):
+        self._node = node
+        self._topic = f"/world/{world}/clock"
+        self._updated = Condition()
+        self._clock = 0.0
+
+        if not node.subscribe(Clock, self._topic, self._update):
+            raise LockstepError(f"Could not subscribe to the clock of world {world}")
+
+    def _update(self, msg: Clock):
+        with self._updated:
+            self._clock = msg.sim.sec + msg.sim.nsec / 1e9
+            self._updated.notify_all()
+
+    def now(self) -> float:
+        return self._clock
+
+    def wait_until(self, clock: float, timeout: float | None = None) -> bool:
+        with self._updated:
+            return self._updated.wait_for(lambda: self._clock >= clock, timeout)
+
+    def close(self):
+        self._node.unsubscribe(self._topic)
+
+
+class Lockstep:
+    """Keeps the world paused and advances it a fixed number of physics steps on request."""
+
+    def __init__(self, node: Node, world: str, step_size: float = DEFAULT_STEP_SIZE, timeout: int = 1000):
+        self._node = node
+        self._world = world
+        self._timeout = timeout
+        self.step_size = step_size
+
+    def _control(self, msg: WorldControl):
+        res, rep = self._node.request(f"/world/{self._world}/control", msg, WorldControl, Boolean, self._timeout)
+
+        if not res or not rep.data:
+            raise LockstepError(f"World control request for {self._world} failed")
+
+    def configure(self):
+        """Pause the world and lift its real-time pacing, so each request runs as fast as it can."""
+
+        msg = WorldControl()
+        msg.pause = True
+        self._control(msg)
+
+        physics = Physics()
+        physics.max_step_size = self.step_size
+        # A real-time factor of 0 makes gz-sim step without sleeping between iterations.
+        physics.real_time_factor = 0.0
+        res, rep = self._node.request(f"/world/{self._world}/set_physics", physics, Physics, Boolean, self._timeout)
+
+        if not res or not rep.data:
+            raise LockstepError(f"Could not set physics of world {self._world}")
+
+    def steps(self, seconds: float) -> int:
+        return max(1, round(seconds / self.step_size))
+
+    def advance(self, seconds: float) -> int:
+        """Step the world by seconds rounded to whole physics steps; return the steps taken.
+
+        Callers tracking the simulation time should count these steps rather than seconds, since a
+        period that is not a multiple of step_size is never reached exactly.
+        """
+
+        steps = self.steps(seconds)
+        msg = WorldControl()
+        msg.pause = True
+        msg.multi_step = steps
+        self._control(msg)
+
+        return steps
+
+    def sync(self, clock: SimClock, timeout: float | None = None) -> float:
+        """Take one physics step and return the simulation time once clock has caught up with it.
+
+        Readings delivered before the world was paused may lag the actual time; after this step
+        the clock is current, so ticks can be counted from it.
+        """
+
+        before = clock.now()
+        self.advance(self.step_size)
+
+        if not clock.wait_until(before + self.step_size - TOLERANCE, timeout):
+            raise LockstepError("Simulation clock did not advance after a single step")
+
+        return clock.now()
@@ -1,11 +1,16 @@
 from __future__ import annotations
 
-from collections.abc import Iterable
+import typing
+from array import array
+from collections.abc import Iterable, Iterator
 from dataclasses import dataclass, field
 
 import attack
 import automaton
 
+if typing.TYPE_CHECKING:
+    import rover
+
 
 @dataclass()
 class Step:
@@ -16,9 +21,127 @@ class Step:
     state: automaton.State = field()
 
 
+class Sample(typing.NamedTuple):
+    time: float
+    x: float
+    y: float
+    z: float
+    heading: float
+    roll: float
+    state: int
+
+
+class Trace:
+    """Columnar simulation trace.
+
+    Every field of a step lives in its own flat ``array`` column: doubles for the time, position,
+    heading and roll, and one unsigned byte per step for the ``automaton.State.code`` of the
+    controller state. Unlike a list of ``Step`` objects, no model references are retained.
+    """
+
+    FLOAT_COLUMNS: typing.ClassVar[tuple[str, ...]] = ("time", "x", "y", "z", "heading", "roll")
+    SIGNALS: typing.ClassVar[dict[str, str]] = {"x": "x", "y": "y", "z": "z", "theta": "heading", "omega": "roll"}
+
+    def __init__(self, columns: dict[str, array] | None = None, states: array | None = None):
+        if columns is None:
+            columns = {name: array("d") for name in self.FLOAT_COLUMNS}
+
+        if states is None:
+            states = array("B")
+
+        if any(len(column) != len(states) for column in columns.values()):
+            raise ValueError("Trace columns must all have the same length")
+
+        self.columns = columns
+        self.states = states
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+    def __iter__(self) -> Iterator[Sample]:
+        columns = [self.columns[name] for name in self.FLOAT_COLUMNS]
+        return (Sample(*values) for values in zip(*columns, self.states))
+
+    def append(
+        self,
+        time: float,
+        position: tuple[float, float, float],
+        heading: float,
+        roll: float,
+        state: automaton.State | int,
+    ):
+        columns = self.columns
+        columns["time"].append(time)
+        columns["x"].append(position[0])
+        columns["y"].append(position[1])
+        columns["z"].append(position[2])
+        columns["heading"].append(heading)
+        columns["roll"].append(roll)
+        self.states.append(state if isinstance(state, int) else state.code)
+
+    def extend(self, other: Trace):
+        for name, column in self.columns.items():
+            column.extend(other.columns[name])
+
+        self.states.extend(other.states)
+
+    def signal(self, name: str) -> array:
+        """Column of the named specification signal, using the names produced by ``to_dict``."""
+
+        return self.columns[self.SIGNALS[name]]
+
+    def record(self, snapshot: rover.PoseSnapshot, state: automaton.State | int):
+        self.append(snapshot.clock, snapshot.position, snapshot.heading, snapshot.roll, state)
+
+    def view(self, start: int | None = None, stop: int | None = None) -> dict[str, memoryview]:
+        """Zero-copy views of every column between start and stop.
+
+        The views pin the underlying arrays, so they must be released before appending again.
+        """
+
+        window = slice(start, stop)
+        views = {name: memoryview(column)[window] for name, column in self.columns.items()}
+        views["state"] = memoryview(self.states)[window]
+
+        return views
+
+    def to_dict(self) -> dict[float, dict[str, float]]:
+        """Convert to the ``{time: {signal: value}}`` mapping used to build ``staliro.Trace``."""
+
+        signals = [(signal, self.columns[column]) for signal, column in self.SIGNALS.items()]
+
+        return {
+            time: {signal: column[index] for signal, column in signals}
+            for index, time in enumerate(self.columns["time"])
+        }
+
+    @classmethod
+    def from_steps(cls, steps: Iterable[Step]) -> Trace:
+        trace = cls()
+
+        for step in steps:
+            trace.append(step.time, step.position, step.heading, step.roll, step.state)
+
+        return trace
+
+
 @dataclass()
 class Result:
-    history: list[Step] = field()
+    history: Trace = field()
+
+
+@dataclass()
+class Chunk:
+    """Part of a trace streamed while the simulation is still running."""
+
+    offset: int = field()
+    trace: Trace = field()
+    final: bool = field(default=False)
+
+
+@dataclass()
+class Abort:
+    """Ask a publisher to end the current simulation early and reply with the trace so far."""
 
 
 @dataclass()
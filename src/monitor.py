@@ -0,0 +1,93 @@
+"""Online robustness monitors evaluated on trace chunks while a simulation is still running."""
+
+from __future__ import annotations
+
+import enum
+import math
+import operator
+import re
+import typing
+
+if typing.TYPE_CHECKING:
+    import messages
+
+_ALWAYS = re.compile(r"^\s*always\s*\(\s*(\w+)\s*(>=|<=|>|<)\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*\)\s*$")
+
+
+class Verdict(enum.Enum):
+    UNDECIDED = enum.auto()
+    SATISFIED = enum.auto()
+    FALSIFIED = enum.auto()
+
+
+class MonitorError(Exception):
+    pass
+
+
+class AlwaysMonitor:
+    """Incremental robustness of ``always (signal op threshold)``.
+
+    The robustness of the formula is the minimum over all samples of the signed distance between the
+    signal and the threshold. Once it is negative no later sample can raise it again, so the verdict
+    is fixed at the first falsifying sample and the remainder of the simulation can be skipped.
+    """
+
+    def __init__(self, signal: str, op: str, threshold: float):
+        if op not in (">", ">=", "<", "<="):
+            raise MonitorError(f"Unsupported comparison {op}")
+
+        self.signal = signal
+        self.op = op
+        self.threshold = threshold
+        self.robustness = math.inf
+        self.samples = 0
+        self._sign = 1.0 if op in (">", ">=") else -1.0
+        self._violated = operator.le if op in (">", "<") else operator.lt
+
+    @classmethod
+    def parse(cls, spec: str) -> AlwaysMonitor:
+        match = _ALWAYS.match(spec)
+
+        if match is None:
+            raise MonitorError(f"No online monitor for specification {spec!r}")
+
+        signal, op, threshold = match.groups()
+        return cls(signal, op, float(threshold))
+
+    @property
+    def verdict(self) -> Verdict:
+        if self.samples and self._violated(self.robustness, 0.0):
+            return Verdict.FALSIFIED
+
+        return Verdict.UNDECIDED
+
+    def update(self, trace: messages.Trace) -> Verdict:
+        """Fold the samples of a trace chunk into the robustness and return the current verdict."""
+
+        column = trace.signal(self.signal)
+
+        if len(column):
+            if self._sign > 0:
+                robustness = min(column) - self.threshold
+            else:
+                robustness = self.threshold - max(column)
+
+            self.robustness = min(self.robustness, robustness)
+            self.samples += len(column)
+
+        return self.verdict
+
+    def finish(self) -> Verdict:
+        """Verdict once the trace is complete: satisfied unless a sample already falsified it."""
+
+        verdict = self.verdict
+        return Verdict.SATISFIED if verdict is Verdict.UNDECIDED and self.samples else verdict
+
+
+def online_monitor(spec: str) -> AlwaysMonitor | None:
+    """Build an online monitor for spec, or None if the specification is not supported online."""
+
+    try:
+        return AlwaysMonitor.parse(spec)
+    except MonitorError:
+        return None
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from collections.abc import Callable
+from functools import partial
 from itertools import repeat
 from pathlib import Path
 from pprint import pprint
@@ -12,59 +14,191 @@ import zmq
 import automaton
 import messages
 import rover
+import scheduler
+import wire
+from history import StateHistory
 
 
 class PublisherError(Exception):
     pass
 
 
-def run(world: str, frequency: int, msg: messages.Start) -> list[messages.Step]:
+def simulate(
+    vehicle: rover.Rover,
+    controller: automaton.Automaton | automaton.CompactAutomaton,
+    frequency: int,
+    msg: messages.Start,
+    stream: wire.TraceStreamer | None = None,
+    control: zmq.Socket | None = None,
+    jobs: scheduler.Scheduler | None = None,
+) -> messages.Trace:
     logger = getLogger("publisher")
     logger.addHandler(NullHandler())
 
     cmds = iter(msg.commands)
-    vehicle = rover.spawn(world, magnet=msg.magnet)
-    controller = automaton.Automaton(vehicle)
-    scheduler = sched.BlockingScheduler()
-    history: list[messages.Step] = []
+    jobs = jobs if jobs is not None else sched.BlockingScheduler()
+    history = messages.Trace()
 
     def update():
         logger.debug("Running controller update")
-        history.append(
-            messages.Step(
-                time=vehicle.clock,
-                position=vehicle.position,
-                heading=vehicle.heading,
-                roll=vehicle.roll,
-                state=controller.state,
-            )
-        )
-
-        if controller.state.is_terminal():
+        history.record(vehicle.snapshot(), controller.code)
+
+        if stream is not None:
+            stream.push(history)
+
+        if control is not None and control.poll(0) and isinstance(wire.recv(control), messages.Abort):
+            logger.debug("Received abort message. Shutting down scheduler.")
+            jobs.shutdown()
+        elif controller.is_terminal():
             logger.debug("Found terminal state. Shutting down scheduler.")
-            scheduler.shutdown()
+            jobs.shutdown()
         else:
-            last_state = controller.state
+            last_state = controller.code
             controller.step(next(cmds))
-            logger.debug(f"Stepping controller. Last state: {last_state} -> Current state: {controller.state}")
+
+            if logger.isEnabledFor(DEBUG):
+                logger.debug(f"Stepping controller. Last state: S{last_state} -> Current state: {controller.state}")
 
     logger.debug("Creating controller scheduler job")
-    scheduler.add_job(update, "interval", seconds=1/frequency)
+    jobs.add_job(update, "interval", seconds=1/frequency)
 
     logger.debug("Starting scheduler")
-    scheduler.start()
+    jobs.start()
+
+    if stream is not None:
+        stream.close(history)
 
     return history
 
 
+def run(
+    world: str,
+    frequency: int,
+    msg: messages.Start,
+    stream: wire.TraceStreamer | None = None,
+    control: zmq.Socket | None = None,
+    make_controller: Callable[[automaton.Vehicle], automaton.Automaton | automaton.CompactAutomaton] = automaton.create,
+    timing: scheduler.Timing = scheduler.Timing(),
+) -> messages.Trace:
+    vehicle = rover.spawn(world, magnet=msg.magnet, pose_rate=timing.pose_rate)
+    controller = make_controller(vehicle)
+
+    try:
+        return simulate(vehicle, controller, frequency, msg, stream, control, timing.create(vehicle, world))
+    finally:
+        controller.recorder.close()
+
+
+def serve_runs(
+    sock: zmq.Socket,
+    world: str,
+    frequency: int,
+    stream: wire.TraceStreamer | None,
+    control: zmq.Socket | None,
+    make_controller: Callable[[automaton.Vehicle], automaton.Automaton | automaton.CompactAutomaton] = automaton.create,
+    timing: scheduler.Timing = scheduler.Timing(),
+    fresh_world: bool = False,
+):
+    """Answer Start messages until the process is stopped.
+
+    The rover is spawned once. Before every later run the automaton, the pose handler and the rover
+    pose are reset, reusing the same transport node and motor publisher. With fresh_world the rover
+    is instead removed, the world is reset and a new rover and automaton are created, so every run
+    starts from the same state as a cold start at the cost of a respawn.
+    """
+
+    logger = getLogger("publisher")
+    logger.addHandler(NullHandler())
+    vehicle: rover.Rover | None = None
+    controller: automaton.Automaton | automaton.CompactAutomaton | None = None
+    runs = 0
+
+    while True:
+        logger.debug("Listening for start message.")
+        msg = wire.recv(sock)
+
+        if not isinstance(msg, messages.Start):
+            wire.send(sock, PublisherError(f"Unexpected start message type {type(msg)}"))
+            continue
+
+        try:
+            if vehicle is not None and fresh_world:
+                logger.debug("Removing previous rover and resetting world.")
+                node = vehicle.node
+                rover.remove(world, node=node)
+                rover.reset_world(world, node=node)
+                # Release the old pose subscription and motor publisher before the node is reused.
+                vehicle.close()
+                vehicle = controller = None
+                vehicle = rover.spawn(world, magnet=msg.magnet, pose_rate=timing.pose_rate, node=node)
+                controller = make_controller(vehicle)
+                # The recorder is shared between controllers; start its next run as reset() would.
+                controller.reset()
+            elif vehicle is None or controller is None:
+                vehicle = rover.spawn(world, magnet=msg.magnet, pose_rate=timing.pose_rate)
+                controller = make_controller(vehicle)
+            else:
+                logger.debug("Resetting rover and controller.")
+                vehicle.reset(msg.magnet)
+                controller.reset()
+        except rover.RoverError as e:
+            wire.send(sock, e)
+            continue
+
+        # Drop an abort that arrived after the previous run had already finished.
+        while control is not None and control.poll(0):
+            wire.recv(control)
+
+        logger.debug(f"Start message received. Running simulation {runs}.")
+        history = simulate(vehicle, controller, frequency, msg, stream, control, timing.create(vehicle, world))
+        controller.recorder.flush()
+        wire.send(sock, messages.Result(history))
+
+        if stream is not None:
+            stream.reset()
+
+        runs += 1
+
+
 @click.command()
 @click.option("-w", "--world", default="default")
 @click.option("-f", "--frequency", type=int, default=1)
 @click.option("-s", "--socket", "socket_path", type=click.Path(exists=True, dir_okay=False, writable=True, path_type=Path), default=None)
+@click.option("--stream", "stream_path", type=click.Path(exists=True, dir_okay=False, writable=True, path_type=Path), default=None)
+@click.option("--batch", type=click.IntRange(min=1), default=1)
+@click.option("--control", "control_path", type=click.Path(exists=True, dir_okay=False, writable=True, path_type=Path), default=None)
+@click.option("--serve", is_flag=True, help="Keep answering start messages instead of exiting after one run.")
+@click.option("--fresh-world", is_flag=True, help="With --serve, respawn the rover in a reset world before every run after the first.")
+@click.option("--compact", is_flag=True, help="Use the table-driven automaton; run with python -O to skip its invariant checks.")
+@click.option("--history-runs", type=click.IntRange(min=1), default=None, help="Keep only this many runs of controller states in memory.")
+@click.option("--history-spill", type=click.Path(dir_okay=False, writable=True, path_type=Path), default=None, help="Also append every controller state run to this file.")
+@click.option("--clock", "clock_mode", type=click.Choice(scheduler.MODES), default="wall", help="Time controller updates by the wall clock, simulation time, or lock-stepped with physics.")
+@click.option("--clock-source", type=click.Choice(scheduler.CLOCKS), default="pose", help="Read simulation time from rover poses or the world clock topic.")
+@click.option("--step-size", type=click.FloatRange(min=0, min_open=True), default=scheduler.DEFAULT_STEP_SIZE, help="Physics step size in seconds for lock-stepped runs.")
 @click.option("-v", "--verbose", is_flag=True)
-def publisher(world: str, frequency: int, socket_path: Path | None, verbose: bool):
+def publisher(
+    world: str,
+    frequency: int,
+    socket_path: Path | None,
+    stream_path: Path | None,
+    batch: int,
+    control_path: Path | None,
+    serve: bool,
+    fresh_world: bool,
+    compact: bool,
+    history_runs: int | None,
+    history_spill: Path | None,
+    clock_mode: str,
+    clock_source: str,
+    step_size: float,
+    verbose: bool,
+):
     logger = getLogger("publisher")
     logger.addHandler(NullHandler())
+    make_controller = partial(
+        automaton.create, compact=compact, recorder=StateHistory(history_runs, history_spill)
+    )
+    timing = scheduler.Timing(clock_mode, clock_source, step_size)
 
     if verbose:
         basicConfig(level=DEBUG)
@@ -73,23 +207,38 @@ def publisher(world: str, frequency: int, socket_path: Path | None, verbose: boo
         logger.debug("No socket provided, starting controller using defaults.")
 
         msg = messages.Start(commands=repeat(None), magnet=None)
-        history = run(world, frequency, msg)
+        history = run(world, frequency, msg, make_controller=make_controller, timing=timing)
 
-        pprint(history)
+        pprint(list(history))
     else:
 
         with zmq.Context() as ctx:
-            with ctx.socket(zmq.REP) as sock:
-                with sock.connect(str(socket_path)):
-                    logger.debug("Listening for start message.")
-                    msg = sock.recv_pyobj()
-
-                    if not isinstance(msg, messages.Start):
-                        sock.send_pyobj(PublisherError(f"Unexpected start message type {type(msg)}"))
-
-                    logger.debug("Start message received. Running simulation.")
-                    history = run(world, frequency, msg)
-                    sock.send_pyobj(messages.Result(history))
+            with ctx.socket(zmq.REP) as sock, ctx.socket(zmq.PUSH) as stream_sock, ctx.socket(zmq.PULL) as control_sock:
+                with sock.connect(wire.address(socket_path)):
+                    stream = None
+                    control = None
+
+                    if stream_path is not None:
+                        logger.debug(f"Streaming trace in batches of {batch} steps.")
+                        stream_sock.connect(wire.address(stream_path))
+                        stream = wire.TraceStreamer(stream_sock, batch)
+
+                    if control_path is not None:
+                        control_sock.connect(wire.address(control_path))
+                        control = control_sock
+
+                    if serve:
+                        serve_runs(sock, world, frequency, stream, control, make_controller, timing, fresh_world)
+                    else:
+                        logger.debug("Listening for start message.")
+                        msg = wire.recv(sock)
+
+                        if not isinstance(msg, messages.Start):
+                            wire.send(sock, PublisherError(f"Unexpected start message type {type(msg)}"))
+
+                        logger.debug("Start message received. Running simulation.")
+                        history = run(world, frequency, msg, stream, control, make_controller, timing)
+                        wire.send(sock, messages.Result(history))
 
 
 if __name__ == "__main__":
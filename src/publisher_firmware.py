@@ -11,13 +11,14 @@ import zmq
 import automaton
 import messages
 import rover
+import wire
 
 
 class PublisherError(Exception):
     pass
 
 
-def run(world: str, frequency: int, msg: messages.Start) -> list[messages.Step]:
+def run(world: str, frequency: int, msg: messages.Start, stream: wire.TraceStreamer | None = None) -> messages.Trace:
     
     logger = getLogger("publisher")
     logger.addHandler(NullHandler())
@@ -68,15 +69,22 @@ def run(world: str, frequency: int, msg: messages.Start) -> list[messages.Step]:
 
     # return history
     # TODO: right now we just return an empty history, since we don't want to involve psi-taliro for now.
-    return []
+    history = messages.Trace()
+
+    if stream is not None:
+        stream.close(history)
+
+    return history
 
 
 @click.command()
 @click.option("-w", "--world", default="default")
 @click.option("-f", "--frequency", type=int, default=1)
 @click.option("-s", "--socket", "socket_path", type=click.Path(exists=True, dir_okay=False, writable=True, path_type=Path), default=None)
+@click.option("--stream", "stream_path", type=click.Path(exists=True, dir_okay=False, writable=True, path_type=Path), default=None)
+@click.option("--batch", type=click.IntRange(min=1), default=1)
 @click.option("-v", "--verbose", is_flag=True)
-def publisher(world: str, frequency: int, socket_path: Path | None, verbose: bool):
+def publisher(world: str, frequency: int, socket_path: Path | None, stream_path: Path | None, batch: int, verbose: bool):
     logger = getLogger("publisher")
     logger.addHandler(NullHandler())
 
@@ -93,17 +101,24 @@ def publisher(world: str, frequency: int, socket_path: Path | None, verbose: boo
     else:
 
         with zmq.Context() as ctx:
-            with ctx.socket(zmq.REP) as sock:
+            with ctx.socket(zmq.REP) as sock, ctx.socket(zmq.PUSH) as stream_sock:
                 with sock.connect(str(socket_path)):
+                    stream = None
+
+                    if stream_path is not None:
+                        logger.debug(f"Streaming trace in batches of {batch} steps.")
+                        stream_sock.connect(wire.address(stream_path))
+                        stream = wire.TraceStreamer(stream_sock, batch)
+
                     logger.debug("Listening for start message.")
-                    msg = sock.recv_pyobj()
+                    msg = wire.recv(sock)
 
                     if not isinstance(msg, messages.Start):
-                        sock.send_pyobj(PublisherError(f"Unexpected start message type {type(msg)}"))
+                        wire.send(sock, PublisherError(f"Unexpected start message type {type(msg)}"))
 
                     logger.debug("Start message received. Running simulation.")
-                    history = run(world, frequency, msg)
-                    sock.send_pyobj(messages.Result(history))
+                    history = run(world, frequency, msg, stream)
+                    wire.send(sock, messages.Result(history))
 
 
 if __name__ == "__main__":
@@ -1,20 +1,33 @@
 from __future__ import annotations
 
+import math
+import time
+from array import array
+from collections import deque
+from collections.abc import Iterable, Sequence
 from dataclasses import dataclass, field
-from logging import Logger, NullHandler, getLogger
+from logging import DEBUG, Logger, NullHandler, getLogger
 from math import pi
-from threading import Lock
+from queue import Queue
+from threading import Condition, Lock, Thread
 
 from gz.transport13 import Node, Publisher, SubscribeOptions
 from gz.math7 import Quaterniond
 from gz.msgs10.actuators_pb2 import Actuators
 from gz.msgs10.boolean_pb2 import Boolean
+from gz.msgs10.entity_pb2 import Entity
 from gz.msgs10.entity_factory_pb2 import EntityFactory
+from gz.msgs10.pose_pb2 import Pose
 from gz.msgs10.pose_v_pb2 import Pose_V
+from gz.msgs10.world_control_pb2 import WorldControl
 
 import attack
 import automaton
 
+SPAWN_POSITION: tuple[float, float, float] = (0.0, 0.0, 0.0)
+SPAWN_YAW: float = 0.0
+
+
 def _pose_logger() -> Logger:
     logger = getLogger("rover.PoseHandler")
     logger.addHandler(NullHandler())
@@ -22,57 +35,463 @@ def _pose_logger() -> Logger:
     return logger
 
 
+@dataclass(frozen=True, slots=True)
+class PoseSnapshot:
+    """Vehicle state taken from a single pose message. Heading is in degrees, roll in radians."""
+
+    clock: float = field()
+    position: tuple[float, float, float] = field()
+    heading: float = field()
+    roll: float = field()
+
+
+_ORIGIN = PoseSnapshot(0.0, (0.0, 0.0, 0.0), 0.0, 0.0)
+
+
+def _slerp(
+    q0: tuple[float, float, float, float], q1: tuple[float, float, float, float], alpha: float
+) -> tuple[float, float, float, float]:
+    """Spherical linear interpolation between two (w, x, y, z) unit quaternions."""
+
+    dot = sum(a * b for a, b in zip(q0, q1))
+
+    if dot < 0.0:
+        q1 = (-q1[0], -q1[1], -q1[2], -q1[3])
+        dot = -dot
+
+    if dot > 0.9995:
+        q = tuple(a + alpha * (b - a) for a, b in zip(q0, q1))
+        norm = math.sqrt(sum(c * c for c in q))
+        return (q[0] / norm, q[1] / norm, q[2] / norm, q[3] / norm)
+
+    theta = math.acos(dot)
+    sin_theta = math.sin(theta)
+    w0 = math.sin((1.0 - alpha) * theta) / sin_theta
+    w1 = math.sin(alpha * theta) / sin_theta
+    return (
+        w0 * q0[0] + w1 * q1[0],
+        w0 * q0[1] + w1 * q1[1],
+        w0 * q0[2] + w1 * q1[2],
+        w0 * q0[3] + w1 * q1[3],
+    )
+
+
+class PoseHistory:
+    """Fixed-size ring buffer of timestamped poses stored in flat ``array`` columns.
+
+    Samples are kept in simulation time order, so the pose at any buffered time is found by a binary
+    search and interpolated between its neighbours: linearly for the position and by slerp for the
+    orientation. A sample older than the newest one (e.g. after a world reset) clears the buffer.
+    """
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError("Pose history capacity must be positive")
+
+        self._capacity = capacity
+        self._start = 0
+        self._size = 0
+        self._columns = [array("d", bytes(8 * capacity)) for _ in range(8)]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
+
+    def append(self, clock: float, position: tuple[float, float, float], orientation: tuple[float, float, float, float]):
+        times = self._columns[0]
+
+        if self._size:
+            newest = (self._start + self._size - 1) % self._capacity
+
+            if clock < times[newest]:
+                self.clear()
+            elif clock == times[newest]:
+                self._write(newest, clock, position, orientation)
+                return
+
+        if self._size < self._capacity:
+            slot = (self._start + self._size) % self._capacity
+            self._size += 1
+        else:
+            slot = self._start
+            self._start = (self._start + 1) % self._capacity
+
+        self._write(slot, clock, position, orientation)
+
+    def _write(self, slot: int, clock: float, position: tuple[float, float, float], orientation: tuple[float, float, float, float]):
+        values = (clock, *position, *orientation)
+
+        for column, value in zip(self._columns, values):
+            column[slot] = value
+
+    def _slot(self, index: int) -> int:
+        return (self._start + index) % self._capacity
+
+    def _read(self, index: int) -> tuple[float, tuple[float, float, float], tuple[float, float, float, float]]:
+        slot = self._slot(index)
+        t, x, y, z, qw, qx, qy, qz = (column[slot] for column in self._columns)
+        return t, (x, y, z), (qw, qx, qy, qz)
+
+    def span(self) -> tuple[float, float] | None:
+        """The oldest and newest buffered simulation times."""
+
+        if not self._size:
+            return None
+
+        times = self._columns[0]
+        return (times[self._slot(0)], times[self._slot(self._size - 1)])
+
+    def at(self, clock: float) -> PoseSnapshot | None:
+        """Interpolated pose at the given simulation time, or None if it is outside the buffer."""
+
+        span = self.span()
+
+        if span is None or not span[0] <= clock <= span[1]:
+            return None
+
+        times = self._columns[0]
+        lo, hi = 0, self._size
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+
+            if times[self._slot(mid)] <= clock:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        t0, p0, q0 = self._read(lo - 1)
+
+        if lo == self._size or t0 == clock:
+            return _to_snapshot(t0, p0, q0)
+
+        t1, p1, q1 = self._read(lo)
+        alpha = (clock - t0) / (t1 - t0)
+        position = (
+            p0[0] + alpha * (p1[0] - p0[0]),
+            p0[1] + alpha * (p1[1] - p0[1]),
+            p0[2] + alpha * (p1[2] - p0[2]),
+        )
+
+        return _to_snapshot(clock, position, _slerp(q0, q1, alpha))
+
+
+def _to_snapshot(clock: float, position: tuple[float, float, float], q: tuple[float, float, float, float]) -> PoseSnapshot:
+    euler = Quaterniond(*q).euler()
+    return PoseSnapshot(clock=clock, position=position, heading=euler.z() * (180 / pi), roll=euler.y())
+
+
 @dataclass()
 class PoseHandler:
     _name: str = field() 
+    _history_size: int = field(default=0)
     _lock: Lock = field(default_factory=Lock, init=False)
-    _heading: float = field(default=0.0, init=False)
-    _roll: float = field(default=0.0, init=False)
-    _position: tuple[float, float, float] = field(default=(0.0, 0.0, 0.0), init=False)
-    _clock: float = field(default=0.0, init=False)
+    _snapshot: PoseSnapshot = field(default=_ORIGIN, init=False)
+    _sequence: int = field(default=0, init=False)
     _logger: Logger = field(default_factory=_pose_logger, init=False)
+    _updated: Condition = field(init=False)
+    _index: int = field(default=-1, init=False)
+    _entity: int = field(default=0, init=False)
+    _history: PoseHistory | None = field(default=None, init=False)
+
+    def __post_init__(self):
+        self._updated = Condition(self._lock)
+
+        if self._history_size:
+            self._history = PoseHistory(self._history_size)
 
     def __call__(self, msg: Pose_V):
-        for pose in msg.pose:
+        pose = self.lookup(msg)
+
+        if pose is not None:
+            self.update(pose, msg.header.stamp.sec + msg.header.stamp.nsec / 1e9)
+
+    def lookup(self, msg: Pose_V) -> Pose | None:
+        """Find the tracked model's pose, trying the index it had in the previous message first.
+
+        The cached slot is confirmed by entity id, so a full scan by name only happens for the first
+        message and whenever the world's entity layout changes.
+        """
+
+        poses = msg.pose
+        pose = self.cached(poses)
+
+        if pose is not None:
+            return pose
+
+        for index, pose in enumerate(poses):
             if pose.name == self._name:
-                self._logger.debug(f"Received pose: {pose}")
+                self.learn(index, pose)
+                return pose
+
+        return None
+
+    def cached(self, poses: Sequence[Pose]) -> Pose | None:
+        index = self._index
+
+        if 0 <= index < len(poses):
+            pose = poses[index]
+
+            if (pose.id == self._entity) if self._entity else (pose.name == self._name):
+                return pose
+
+        return None
+
+    def learn(self, index: int, pose: Pose):
+        self._index = index
+        self._entity = pose.id
+
+    def update(self, pose: Pose, clock: float):
+        if self._logger.isEnabledFor(DEBUG):
+            self._logger.debug("Received pose: %s", pose)
+
+        orientation = (pose.orientation.w, pose.orientation.x, pose.orientation.y, pose.orientation.z)
+        position = (pose.position.x, pose.position.y, pose.position.z)
+        snapshot = _to_snapshot(clock, position, orientation)
+
+        # Readers never take the lock: publishing is a single reference swap to an immutable record.
+        # The lock only orders writers and wakes wait_for_motion.
+        with self._lock:
+            self._snapshot = snapshot
+            self._sequence += 1
+
+            if self._history is not None:
+                self._history.append(clock, position, orientation)
+
+            self._updated.notify_all()
+
+    def wait_for_motion(
+        self, origin: tuple[float, float, float], distance: float = 0.0, timeout: float | None = None
+    ) -> tuple[float, float, float] | None:
+        """Block until the position differs from origin by more than distance along any axis.
+
+        The wait is woken by every pose message, so its latency follows the topic rate. Returns the
+        new position, or None if timeout seconds pass first.
+        """
+
+        def moved() -> bool:
+            return any(abs(a - b) > distance for a, b in zip(self._snapshot.position, origin))
 
-                time = msg.header.stamp.sec + msg.header.stamp.nsec / 1e9
-                q = Quaterniond(
-                    pose.orientation.w,
-                    pose.orientation.x,
-                    pose.orientation.y,
-                    pose.orientation.z,
-                )
+        with self._updated:
+            if self._updated.wait_for(moved, timeout):
+                return self._snapshot.position
+            return None
 
-                with self._lock:
-                    euler = q.euler()
-                    self._heading = euler.z()
-                    self._roll = euler.y()
-                    self._position = (pose.position.x, pose.position.y, pose.position.z)
-                    self._clock = time
+    def wait_for_clock(self, clock: float, timeout: float | None = None) -> bool:
+        """Block until a pose stamped at or after the given simulation time arrives."""
 
-                break
+        with self._updated:
+            return self._updated.wait_for(lambda: self._snapshot.clock >= clock, timeout)
+
+    def reset(self, position: tuple[float, float, float], heading: float = 0.0):
+        """Forget the pose and history of the previous run, keeping the learned message index.
+
+        The snapshot is moved to the given position and heading in degrees but keeps the last clock:
+        simulation time does not restart, and a clock of 0 would put a sim-timed run far behind.
+        """
+
+        with self._lock:
+            self._snapshot = PoseSnapshot(self._snapshot.clock, position, heading, 0.0)
+
+            if self._history is not None:
+                self._history.clear()
+
+    def snapshot(self) -> PoseSnapshot:
+        """Return clock, position, heading and roll from the same pose message without locking."""
+
+        return self._snapshot
+
+    def pose_at(self, clock: float) -> PoseSnapshot | None:
+        """Pose interpolated from the history at the given simulation time.
+
+        Returns None if the time is outside the buffered range. Requires a non-zero history size.
+        """
+
+        if self._history is None:
+            raise RoverError("Pose history is not enabled for this handler")
+
+        with self._lock:
+            return self._history.at(clock)
+
+    @property
+    def sequence(self) -> int:
+        """Number of pose messages published so far."""
+
+        return self._sequence
 
     @property
     def clock(self) -> float:
-        with self._lock:
-            return self._clock
+        return self._snapshot.clock
 
     @property
     def heading(self) -> float:
-        with self._lock:
-            return self._heading * (180 / pi)
+        return self._snapshot.heading
 
     @property
     def roll(self) -> float:
-        with self._lock:
-            return self._roll
+        return self._snapshot.roll
 
     @property
     def position(self) -> tuple[float, float, float]:
+        return self._snapshot.position
+
+
+class PoseDemux:
+    """Pose topic callback that updates several PoseHandlers from a single pass over each message.
+
+    Handlers whose cached index still matches are served directly. If any of them misses, one scan
+    relocates every missing model, so worlds with many rovers never need one scan per rover.
+    """
+
+    def __init__(self, handlers: Iterable[PoseHandler] = ()):
+        self._handlers: dict[str, PoseHandler] = {}
+
+        for handler in handlers:
+            self.add(handler)
+
+    def add(self, handler: PoseHandler):
+        self._handlers = {**self._handlers, handler._name: handler}
+
+    def __call__(self, msg: Pose_V):
+        handlers = self._handlers
+        poses = msg.pose
+        clock = msg.header.stamp.sec + msg.header.stamp.nsec / 1e9
+        found: list[tuple[PoseHandler, Pose]] = []
+        missing: dict[str, PoseHandler] = {}
+
+        for name, handler in handlers.items():
+            pose = handler.cached(poses)
+
+            if pose is not None:
+                found.append((handler, pose))
+            else:
+                missing[name] = handler
+
+        if missing:
+            for index, pose in enumerate(poses):
+                handler = missing.pop(pose.name, None)
+
+                if handler is not None:
+                    handler.learn(index, pose)
+                    found.append((handler, pose))
+
+                    if not missing:
+                        break
+
+        for handler, pose in found:
+            handler.update(pose, clock)
+
+
+def euler_to_quaternion(roll_deg: float, pitch_deg: float, yaw_deg: float) -> tuple[float, float, float, float]:
+    """Convert Euler angles in degrees to a (x, y, z, w) quaternion.
+
+    Rotation order is roll (X), pitch (Y), yaw (Z).
+    """
+
+    roll = math.radians(roll_deg)
+    pitch = math.radians(pitch_deg)
+    yaw = math.radians(yaw_deg)
+
+    cy = math.cos(yaw * 0.5)
+    sy = math.sin(yaw * 0.5)
+    cp = math.cos(pitch * 0.5)
+    sp = math.sin(pitch * 0.5)
+    cr = math.cos(roll * 0.5)
+    sr = math.sin(roll * 0.5)
+
+    w = cr * cp * cy + sr * sp * sy
+    x = sr * cp * cy - cr * sp * sy
+    y = cr * sp * cy + sr * cp * sy
+    z = cr * cp * sy - sr * sp * cy
+    return (x, y, z, w)
+
+
+class PoseServiceClient:
+    """Set model poses through a world's set_pose service over an in-process transport node.
+
+    The request message is allocated once and refilled on every call. With ``wait=False`` the
+    request is handed to a background thread so the caller can resume immediately.
+    """
+
+    def __init__(self, node: Node, service: str = "/world/default/set_pose", timeout: int = 2000):
+        self._node = node
+        self._service = service
+        self._timeout = timeout
+        self._request = Pose()
+        self._lock = Lock()
+        self._queue: Queue[tuple] = Queue()
+        self._worker: Thread | None = None
+        self._logger = getLogger("rover.PoseServiceClient")
+        self._logger.addHandler(NullHandler())
+        self.latencies: deque[float] = deque(maxlen=1024)
+
+    def set_pose(
+        self,
+        model_name: str,
+        x: float,
+        y: float,
+        z: float,
+        roll_deg: float,
+        pitch_deg: float,
+        yaw_deg: float,
+        *,
+        wait: bool = True,
+    ) -> bool | None:
+        args = (model_name, x, y, z, roll_deg, pitch_deg, yaw_deg)
+
+        if wait:
+            return self._call(*args)
+
+        if self._worker is None:
+            self._worker = Thread(target=self._drain, name="set_pose", daemon=True)
+            self._worker.start()
+
+        self._queue.put(args)
+        return None
+
+    def stats(self) -> tuple[int, float, float]:
+        """Return the number, mean and maximum of the recorded call latencies in seconds."""
+
+        latencies = list(self.latencies)
+
+        if not latencies:
+            return (0, 0.0, 0.0)
+
+        return (len(latencies), sum(latencies) / len(latencies), max(latencies))
+
+    def _drain(self):
+        while True:
+            self._call(*self._queue.get())
+
+    def _call(
+        self, model_name: str, x: float, y: float, z: float, roll_deg: float, pitch_deg: float, yaw_deg: float
+    ) -> bool:
+        qx, qy, qz, qw = euler_to_quaternion(roll_deg, pitch_deg, yaw_deg)
+        start = time.perf_counter()
+
         with self._lock:
-            return self._position
+            self._request.name = model_name
+            self._request.position.x = x
+            self._request.position.y = y
+            self._request.position.z = z
+            self._request.orientation.x = qx
+            self._request.orientation.y = qy
+            self._request.orientation.z = qz
+            self._request.orientation.w = qw
+            res, rep = self._node.request(self._service, self._request, Pose, Boolean, self._timeout)
+
+        latency = time.perf_counter() - start
+        self.latencies.append(latency)
+        ok = bool(res and rep.data)
+
+        if not ok:
+            self._logger.warning(f"Failed to call service {self._service} for {model_name}")
+
+        self._logger.debug(f"set_pose {model_name} took {latency * 1000:.2f} ms")
+        return ok
 
 
 @dataclass()
@@ -81,9 +500,54 @@ class Rover(automaton.Vehicle):
     _motors: Publisher = field()
     _pose: PoseHandler = field()
     _magnet: attack.Magnet = field()
+    _name: str = field(default="r1_rover")
+    _pose_client: PoseServiceClient | None = field(default=None)
+    _world: str | None = field(default=None)
     _velocity: float = field(default=0.0, init=False)
     _omega: float = field(default=0.0, init=False)
 
+    def reset(self, magnet: attack.Magnet | None = None):
+        """Stop the rover and move it back to its spawn pose for another run.
+
+        The transport node, motor publisher and pose subscription are kept, so a new run costs one
+        set_pose call instead of removing and spawning the model again.
+        """
+
+        if self._pose_client is None:
+            raise RoverError("Rover was created without a set_pose client")
+
+        msg = Actuators()
+        msg.velocity.append(0.0)
+        msg.velocity.append(0.0)
+        self._motors.publish(msg)
+        self._velocity = 0.0
+        self._omega = 0.0
+
+        if not self._pose_client.set_pose(self._name, *SPAWN_POSITION, 0.0, 0.0, SPAWN_YAW):
+            raise RoverError("Could not reset rover pose")
+
+        self._pose.reset(SPAWN_POSITION, SPAWN_YAW)
+        self._magnet = magnet if magnet is not None else attack.StationaryMagnet(0.0)
+
+    def close(self):
+        """Stop handling pose messages, so the node can be handed to another rover."""
+
+        if self._world is not None:
+            self._node.unsubscribe(f"/world/{self._world}/pose/info")
+
+    @property
+    def node(self) -> Node:
+        return self._node
+
+    def snapshot(self) -> PoseSnapshot:
+        return self._pose.snapshot()
+
+    def wait_for_clock(self, clock: float, timeout: float | None = None) -> bool:
+        return self._pose.wait_for_clock(clock, timeout)
+
+    def pose_at(self, clock: float) -> PoseSnapshot | None:
+        return self._pose.pose_at(clock)
+
     @property
     def clock(self) -> float:
         return self._pose.clock
@@ -107,12 +571,8 @@ class Rover(automaton.Vehicle):
     @omega.setter
     def omega(self, target: float):
         if target != self._omega:
-            msg = Actuators()
-            msg.velocity.append(target)
-            msg.velocity.append(target)
-
-            self._motors.publish(msg)
             self._omega = target
+            self._publish_wheels()
 
     @property
     def velocity(self) -> float:
@@ -121,12 +581,20 @@ class Rover(automaton.Vehicle):
     @velocity.setter
     def velocity(self, target: float):
         if target != self._velocity:
-            msg = Actuators()
-            msg.velocity.append(-target)
-            msg.velocity.append(target)
-
-            self._motors.publish(msg)
             self._velocity = target
+            self._publish_wheels()
+
+    def _publish_wheels(self):
+        """Drive the wheels at (-v, v) for the velocity plus (w, w) for omega, the left one reversed.
+
+        Both commands are combined, so setting omega back to 0 right after a velocity keeps driving.
+        """
+
+        msg = Actuators()
+        msg.velocity.append(self._omega - self._velocity)
+        msg.velocity.append(self._velocity + self._omega)
+
+        self._motors.publish(msg)
 
 
 class RoverError(Exception):
@@ -137,18 +605,32 @@ class TransportError(RoverError):
     pass
 
 
-def spawn(world: str, *, name: str = "r1_rover", magnet: attack.Magnet | None) -> Rover:
+def spawn(
+    world: str,
+    *,
+    name: str = "r1_rover",
+    magnet: attack.Magnet | None,
+    history: int = 0,
+    pose_rate: int | None = 10,
+    node: Node | None = None,
+) -> Rover:
+    """Create the rover model in the world and connect to it, on node if given or else a new one."""
+
     logger = getLogger("rover")
     logger.addHandler(NullHandler())
     logger.setLevel('DEBUG')
 
-    node = Node()
+    if node is None:
+        node = Node()
+
     msg = EntityFactory()
     # TODO: VERY HACKY HARDCODED PATH
     # msg.sdf_filename = "/app/resources/models/r1_rover/model.sdf"
     msg.sdf_filename = "/app/resources/models/rover_ackermann/model.sdf"
     msg.name = name
     msg.allow_renaming = False
+    msg.pose.position.x, msg.pose.position.y, msg.pose.position.z = SPAWN_POSITION
+    msg.pose.orientation.w = 1.0
     res, rep = node.request(f"/world/{world}/create", msg, EntityFactory, Boolean, timeout=1000)
 
     if not res:
@@ -165,9 +647,12 @@ def spawn(world: str, *, name: str = "r1_rover", magnet: attack.Magnet | None) -
 
     logger.debug("Created motor topic publisher")
 
-    pose = PoseHandler(name)
+    pose = PoseHandler(name, history)
     pose_options = SubscribeOptions()
-    pose_options.msgs_per_sec = 10
+
+    # Without a rate limit every pose message is delivered, which lock-stepped runs rely on.
+    if pose_rate is not None:
+        pose_options.msgs_per_sec = pose_rate
 
     if not node.subscribe(Pose_V, f"/world/{world}/pose/info", pose, pose_options):
         raise TransportError()
@@ -175,18 +660,38 @@ def spawn(world: str, *, name: str = "r1_rover", magnet: attack.Magnet | None) -
     if magnet is None:
         magnet = attack.StationaryMagnet(0.0)
 
-    return Rover(node, motors, pose, magnet)
+    return Rover(node, motors, pose, magnet, name, PoseServiceClient(node, f"/world/{world}/set_pose"), world)
 
-def remove(world: str, *, name: str = "r1_rover"):
-    node = Node()
-    msg = EntityFactory()
-    # msg.sdf_filename = "r1_rover/model.sdf"
+def remove(world: str, *, name: str = "r1_rover", node: Node | None = None):
+    if node is None:
+        node = Node()
+
+    msg = Entity()
     msg.name = name
-    msg.allow_renaming = False
-    res, rep = node.request(f"/world/{world}/remove", msg, EntityFactory, Boolean, timeout=1000)
+    msg.type = Entity.MODEL
+    res, rep = node.request(f"/world/{world}/remove", msg, Entity, Boolean, timeout=1000)
 
     if not res:
-        raise TransportError("Failed to send Gazebo message for rover creation")
+        raise TransportError("Failed to send Gazebo message for rover removal")
 
     if not rep.data:
-        raise RoverError("Could not create rover Gazebo model")
+        raise RoverError("Could not remove rover Gazebo model")
+
+
+def reset_world(world: str, *, node: Node | None = None):
+    """Reset the simulation time and every model of the world to its initial state."""
+
+    if node is None:
+        node = Node()
+
+    msg = WorldControl()
+    msg.pause = False
+    msg.reset.all = True
+    res, rep = node.request(f"/world/{world}/control", msg, WorldControl, Boolean, timeout=1000)
+
+    if not res:
+        raise TransportError("Failed to send Gazebo message for world reset")
+
+    if not rep.data:
+        raise RoverError("Could not reset Gazebo world")
+
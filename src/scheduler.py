@@ -0,0 +1,161 @@
+"""Controller schedulers driven by Gazebo simulation time instead of the wall clock.
+
+``SimTimeScheduler`` exposes the part of the APScheduler API used by the publisher, an interval job
+plus ``start`` and ``shutdown``. Its ticks are multiples of the interval in simulation time, read
+from the rover's pose messages or from the world's clock topic. With a ``lockstep.Lockstep`` the
+world is paused and advanced by exactly one controller period before every tick, at whatever rate
+physics allows, so a run no longer depends on real-time pacing and reproduces step for step.
+"""
+
+from __future__ import annotations
+
+import math
+import typing
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from logging import NullHandler, getLogger
+
+import apscheduler.schedulers.blocking as sched
+
+import lockstep
+import rover
+from lockstep import Lockstep, PoseClock, SimClock, TopicClock
+
+MODES: typing.Final[tuple[str, ...]] = ("wall", "sim", "lockstep")
+CLOCKS: typing.Final[tuple[str, ...]] = ("pose", "topic")
+DEFAULT_STEP_SIZE = lockstep.DEFAULT_STEP_SIZE
+
+
+class SchedulerError(Exception):
+    pass
+
+
+class Scheduler(typing.Protocol):
+    def add_job(self, func: Callable[[], None], trigger: str, *, seconds: float):
+        ...
+
+    def start(self):
+        ...
+
+    def shutdown(self, wait: bool = True):
+        ...
+
+
+class SimTimeScheduler:
+    """Run one interval job on simulation-time ticks.
+
+    Tick k is due at ``start + k * seconds``, where start is the first simulation time read after
+    ``start`` is called. Without a lockstep the world runs on its own, and ticks that have already
+    passed when the previous job returns are skipped and counted in ``missed``. With one, the world
+    only advances for the next tick once the job has returned, so no tick is ever missed; each tick
+    is then due after the whole physics steps taken so far, which is k * seconds rounded per tick.
+    """
+
+    def __init__(self, clock: SimClock, stepper: Lockstep | None = None, timeout: float = 10.0):
+        self._clock = clock
+        self._lockstep = stepper
+        self._timeout = timeout
+        self._job: Callable[[], None] | None = None
+        self._period = 0.0
+        self._running = False
+        self.ticks = 0
+        self.missed = 0
+
+        logger = getLogger("publisher.scheduler")
+        logger.addHandler(NullHandler())
+        self._logger = logger
+
+    def add_job(self, func: Callable[[], None], trigger: str = "interval", *, seconds: float):
+        if trigger != "interval":
+            raise SchedulerError(f"Unsupported trigger {trigger}")
+
+        if self._job is not None:
+            raise SchedulerError("Only one job can be scheduled")
+
+        self._job = func
+        self._period = seconds
+
+    def shutdown(self, wait: bool = True):
+        self._running = False
+
+    def start(self):
+        if self._job is None:
+            raise SchedulerError("No job scheduled")
+
+        try:
+            self._run()
+        finally:
+            self._clock.close()
+
+    def _run(self):
+        if self._lockstep is not None:
+            self._lockstep.configure()
+            start = self._lockstep.sync(self._clock, self._timeout)
+        else:
+            # A clock can still hold the last time seen before a rover reset, so wait for a fresh one.
+            held = self._clock.now()
+
+            if not self._clock.wait_until(math.nextafter(held, math.inf), self._timeout):
+                raise SchedulerError(f"Simulation clock did not advance past {held:.3f} s within {self._timeout} s")
+
+            start = self._clock.now()
+
+        tick = 1
+        steps = 0
+        self._running = True
+
+        while self._running:
+            if self._lockstep is not None:
+                # The world moves in whole physics steps, so the deadline follows the steps taken.
+                steps += self._lockstep.advance(self._period)
+                due = start + steps * self._lockstep.step_size
+            else:
+                due = start + tick * self._period
+
+            if not self._clock.wait_until(due - lockstep.TOLERANCE, self._timeout):
+                raise SchedulerError(f"Simulation clock did not reach {due:.3f} s within {self._timeout} s")
+
+            self._job()
+            self.ticks += 1
+
+            if self._lockstep is None:
+                late = math.floor((self._clock.now() + lockstep.TOLERANCE - start) / self._period) + 1
+
+                if late > tick + 1:
+                    self.missed += late - tick - 1
+                    self._logger.debug(f"Controller missed {late - tick - 1} ticks")
+
+                tick = max(tick + 1, late)
+            else:
+                tick += 1
+
+
+@dataclass(frozen=True)
+class Timing:
+    """How controller updates are timed: ``wall`` clock, ``sim`` time or ``lockstep`` with physics."""
+
+    mode: str = field(default="wall")
+    clock: str = field(default="pose")
+    step_size: float = field(default=DEFAULT_STEP_SIZE)
+
+    def __post_init__(self):
+        if self.mode not in MODES:
+            raise SchedulerError(f"Unknown scheduler mode {self.mode}")
+
+        if self.clock not in CLOCKS:
+            raise SchedulerError(f"Unknown clock source {self.clock}")
+
+    @property
+    def pose_rate(self) -> int | None:
+        """Pose subscription rate limit for the rover; simulation-time ticks need every message."""
+
+        return 10 if self.mode == "wall" else None
+
+    def create(self, vehicle: rover.Rover, world: str) -> Scheduler:
+        if self.mode == "wall":
+            return sched.BlockingScheduler()
+
+        source: SimClock = PoseClock(vehicle) if self.clock == "pose" else TopicClock(vehicle.node, world)
+        stepper = Lockstep(vehicle.node, world, self.step_size) if self.mode == "lockstep" else None
+
+        return SimTimeScheduler(source, stepper)
@@ -1,8 +1,12 @@
 from __future__ import annotations
 
 import contextlib
+import dataclasses
 import itertools
+import multiprocessing.util
+import os
 import pathlib
+import re
 import tempfile
 import typing
 
@@ -15,13 +19,104 @@ import staliro.optimizers
 import staliro.specifications.rtamt
 import zmq
 
+import kinematic
 import messages
+import monitor
+import wire
 
 if typing.TYPE_CHECKING:
-    from collections.abc import Generator
+    from collections.abc import Callable, Generator
 
 GZ_IMAGE: typing.Final[str] = "ghcr.io/cpslab-asu/gzcm/px4/gazebo:harmonic"
 GZ_WORLD: typing.Final[str] = "generated"
+ROVER_SOCK_DIR: typing.Final[str] = "/var/run/rover"
+STREAM_DRAIN_MS: typing.Final[int] = 1000
+RESULT_TIMEOUT_S: typing.Final[float] = 600.0
+
+
+@dataclasses.dataclass(frozen=True)
+class Pair:
+    """Names that keep one rover and Gazebo container pair apart from the others on the host.
+
+    ``world`` is the Gazebo world the pair loads, a renamed copy of ``GZ_WORLD`` unless it is that
+    world, and ``partition`` is the gz-transport partition both of its containers run in.
+    """
+
+    world: str = dataclasses.field(default=GZ_WORLD)
+    partition: str | None = dataclasses.field(default=None)
+
+    @classmethod
+    def of_process(cls) -> Pair:
+        """The pair of the calling process. staliro's worker processes each drive their own."""
+
+        pid = os.getpid()
+        return cls(world=f"{GZ_WORLD}_{pid}", partition=f"swab_{pid}")
+
+
+class _PartitionContainers:
+    """``DockerClient.containers`` adding GZ_PARTITION to the environment of every new container."""
+
+    def __init__(self, containers: typing.Any, partition: str):
+        self._containers = containers
+        self._partition = partition
+
+    def __getattr__(self, name: str) -> typing.Any:
+        return getattr(self._containers, name)
+
+    def _with_partition(self, kwargs: dict[str, typing.Any]) -> dict[str, typing.Any]:
+        environment = kwargs.get("environment") or {}
+
+        if isinstance(environment, dict):
+            environment = {**environment, "GZ_PARTITION": self._partition}
+        else:
+            environment = [*environment, f"GZ_PARTITION={self._partition}"]
+
+        return {**kwargs, "environment": environment}
+
+    def run(self, *args, **kwargs):
+        return self._containers.run(*args, **self._with_partition(kwargs))
+
+    def create(self, *args, **kwargs):
+        return self._containers.create(*args, **self._with_partition(kwargs))
+
+
+class PartitionClient:
+    """Docker client whose containers all join one gz-transport partition.
+
+    gzcm starts the Gazebo container through the client it is given but takes no environment, so
+    the partition is added here, in the same way for the rover and the Gazebo container.
+    """
+
+    def __init__(self, client: docker.DockerClient, partition: str):
+        self._client = client
+        self.containers = _PartitionContainers(client.containers, partition)
+
+    def __getattr__(self, name: str) -> typing.Any:
+        return getattr(self._client, name)
+
+
+def pair_client(pair: Pair) -> docker.DockerClient:
+    client = docker.from_env()
+    return PartitionClient(client, pair.partition) if pair.partition is not None else client
+
+
+@contextlib.contextmanager
+def world_file(world: str) -> Generator[pathlib.Path, None, None]:
+    """The SDF of world: that of ``GZ_WORLD`` itself, or a copy renamed to world while in use."""
+
+    source = pathlib.Path(f"/tmp/{GZ_WORLD}.sdf")
+
+    if world == GZ_WORLD:
+        yield source
+        return
+
+    path = source.with_name(f"{world}.sdf")
+    path.write_text(re.sub(r'(<world\s+name=")[^"]*"', rf'\g<1>{world}"', source.read_text(), count=1))
+
+    try:
+        yield path
+    finally:
+        path.unlink(missing_ok=True)
 
 
 @contextlib.contextmanager
@@ -37,7 +132,18 @@ def temp_path() -> Generator[pathlib.Path, None, None]:
 def create_socket(path: pathlib.Path) -> Generator[zmq.Socket, None, None]:
     with zmq.Context() as ctx:
         with ctx.socket(zmq.REQ) as sock:
-            with sock.connect(str(path)):
+            with sock.bind(wire.address(path)):
+                try:
+                    yield sock
+                finally:
+                    pass
+
+
+@contextlib.contextmanager
+def stream_socket(path: pathlib.Path) -> Generator[zmq.Socket, None, None]:
+    with zmq.Context() as ctx:
+        with ctx.socket(zmq.PULL) as sock:
+            with sock.bind(wire.address(path)):
                 try:
                     yield sock
                 finally:
@@ -45,14 +151,47 @@ def create_socket(path: pathlib.Path) -> Generator[zmq.Socket, None, None]:
 
 
 @contextlib.contextmanager
-def rover_container(client: docker.DockerClient, world: str, sock_path: pathlib.Path):
+def control_socket(path: pathlib.Path) -> Generator[zmq.Socket, None, None]:
+    with zmq.Context() as ctx:
+        with ctx.socket(zmq.PUSH) as sock:
+            with sock.bind(wire.address(path)):
+                try:
+                    yield sock
+                finally:
+                    pass
+
+
+@contextlib.contextmanager
+def rover_container(
+    client: docker.DockerClient,
+    world: str,
+    sock_path: pathlib.Path,
+    stream_path: pathlib.Path | None = None,
+    control_path: pathlib.Path | None = None,
+    serve: bool = False,
+    fresh_world: bool = False,
+):
     sock_dir = sock_path.parent
+    command = f"publisher --world {world} --socket {ROVER_SOCK_DIR}/{sock_path.name}"
+
+    if stream_path is not None:
+        command += f" --stream {ROVER_SOCK_DIR}/{stream_path.name}"
+
+    if control_path is not None:
+        command += f" --control {ROVER_SOCK_DIR}/{control_path.name}"
+
+    if serve:
+        command += " --serve"
+
+    if fresh_world:
+        command += " --fresh-world"
+
     container = client.containers.run(
         image="ghcr.io/cpslab-asu/ngc-rover-ha/rover:latest",
-        command=f"publisher --world {world}",
+        command=command,
         detach=True,
         volumes={
-            "/var/run/rover": {"path": str(sock_dir), "mode": "rw"},
+            ROVER_SOCK_DIR: {"path": str(sock_dir), "mode": "rw"},
         },
     )
 
@@ -71,24 +210,216 @@ def rover_container(client: docker.DockerClient, world: str, sock_path: pathlib.
         container.remove()
 
 
-def run_simulation() -> messages.Result:
-    client = docker.from_env()
+def receive_result(
+    sock: zmq.Socket,
+    stream: zmq.Socket | None = None,
+    on_chunk: Callable[[messages.Chunk], bool | None] | None = None,
+    timeout: float = RESULT_TIMEOUT_S,
+) -> messages.Result | None:
+    """Wait for the simulation result, handing streamed trace chunks to on_chunk as they arrive.
+
+    If on_chunk returns True the wait is abandoned and None is returned. Raises TimeoutError if
+    neither a chunk nor the result arrives for timeout seconds.
+    """
+
+    poller = zmq.Poller()
+    poller.register(sock, zmq.POLLIN)
+    finished = stream is None
+    aborted = False
+
+    def handle_chunk():
+        nonlocal finished, aborted
+        chunk = wire.recv(stream)
+
+        if not isinstance(chunk, messages.Chunk):
+            raise TypeError(f"Unexpected type received on trace stream {type(chunk)}")
+
+        finished = chunk.final
+
+        if on_chunk is not None and on_chunk(chunk):
+            aborted = True
+
+    if stream is not None:
+        poller.register(stream, zmq.POLLIN)
+
+    while True:
+        events = dict(poller.poll(int(timeout * 1000)))
+
+        if not events:
+            raise TimeoutError(f"No simulation result or trace chunk received within {timeout} s")
+
+        if stream is not None and stream in events:
+            handle_chunk()
+
+            if aborted:
+                return None
+
+        if sock in events:
+            break
+
+    msg = wire.recv(sock)
+
+    # The final chunk is queued before the reply, but the two sockets are not ordered.
+    while not finished and not aborted and stream.poll(STREAM_DRAIN_MS):
+        handle_chunk()
+
+    if isinstance(msg, Exception):
+        raise msg
+
+    if not isinstance(msg, messages.Result):
+        raise TypeError(f"Unexpected type received {type(msg)}")
+
+    return msg
+
+
+def _collector(
+    partial: messages.Trace, on_chunk: Callable[[messages.Chunk], bool | None] | None
+) -> Callable[[messages.Chunk], bool | None]:
+    def collect(chunk: messages.Chunk) -> bool | None:
+        partial.extend(chunk.trace)
+        return on_chunk(chunk) if on_chunk is not None else None
+
+    return collect
+
+
+def run_simulation(
+    on_chunk: Callable[[messages.Chunk], bool | None] | None = None,
+    pair: Pair = Pair(),
+) -> messages.Result:
+    """Run one simulation. If on_chunk is given, the trace is also streamed to it while running.
+
+    When on_chunk returns True the containers are torn down right away and the result holds only the
+    part of the trace streamed so far.
+    """
+
+    client = pair_client(pair)
     gz = gzcm.Gazebo()
+    partial = messages.Trace()
+
+    with contextlib.ExitStack() as stack:
+        world = stack.enter_context(world_file(pair.world))
+        sock_path = stack.enter_context(temp_path())
+        sock = stack.enter_context(create_socket(sock_path))
+        stream = None
+        stream_path = None
+
+        if on_chunk is not None:
+            stream_path = sock_path.with_name("stream.sock")
+            stream = stack.enter_context(stream_socket(stream_path))
 
-    with temp_path() as sock_path:
-        with create_socket(sock_path) as sock:
-            with rover_container(client, GZ_WORLD, sock_path) as rover:
-                with gzcm.gazebo.gazebo(gz, rover, image=GZ_IMAGE, client=client, world=pathlib.Path(f"/tmp/{GZ_WORLD}.sdf")):
-                    sock.send_pyobj(messages.Start(commands=itertools.repeat(None), magnet=None))
-                    msg = sock.recv_pyobj()
+        rover = stack.enter_context(rover_container(client, pair.world, sock_path, stream_path))
+        stack.enter_context(gzcm.gazebo.gazebo(gz, rover, image=GZ_IMAGE, client=client, world=world))
+        wire.send(sock, messages.Start(commands=itertools.repeat(None), magnet=None))
+        result = receive_result(sock, stream, _collector(partial, on_chunk) if on_chunk is not None else None)
 
-                    if isinstance(msg, Exception):
-                        raise msg
+        return result if result is not None else messages.Result(partial)
 
-                    if not isinstance(msg, messages.Result):
-                        raise TypeError(f"Unexpected type received {type(msg)}")
 
-                    return msg
+class WarmSimulation:
+    """Rover and Gazebo containers kept alive across simulations.
+
+    The publisher runs with ``--serve`` and answers every Start on the same socket, moving the rover
+    back to its spawn pose first. Per-sample setup therefore costs a pose reset instead of starting
+    two containers, loading the world and spawning the rover. With ``fresh_world`` the publisher
+    removes the rover, resets the world and spawns it again instead.
+    """
+
+    def __init__(self, pair: Pair = Pair(), fresh_world: bool = False):
+        self._stack = contextlib.ExitStack()
+
+        try:
+            client = pair_client(pair)
+            gz = gzcm.Gazebo()
+            world = self._stack.enter_context(world_file(pair.world))
+            sock_path = self._stack.enter_context(temp_path())
+            stream_path = sock_path.with_name("stream.sock")
+            control_path = sock_path.with_name("control.sock")
+            self._sock = self._stack.enter_context(create_socket(sock_path))
+            self._stream = self._stack.enter_context(stream_socket(stream_path))
+            self._control = self._stack.enter_context(control_socket(control_path))
+            rover = self._stack.enter_context(
+                rover_container(
+                    client,
+                    pair.world,
+                    sock_path,
+                    stream_path,
+                    control_path=control_path,
+                    serve=True,
+                    fresh_world=fresh_world,
+                )
+            )
+            self._stack.enter_context(gzcm.gazebo.gazebo(gz, rover, image=GZ_IMAGE, client=client, world=world))
+        except BaseException:
+            self._stack.close()
+            raise
+
+    def run(self, on_chunk: Callable[[messages.Chunk], bool | None] | None = None) -> messages.Result:
+        """Run one simulation; if on_chunk returns True the publisher is told to stop early."""
+
+        partial = messages.Trace()
+        wire.send(self._sock, messages.Start(commands=itertools.repeat(None), magnet=None))
+        result = receive_result(self._sock, self._stream, _collector(partial, on_chunk))
+
+        if result is None:
+            wire.send(self._control, messages.Abort())
+            # Wait for the aborted run's reply so the socket and stream are ready for the next Start.
+            receive_result(self._sock, self._stream)
+            return messages.Result(partial)
+
+        return result
+
+    def close(self):
+        self._stack.close()
+
+
+_warm_simulations: dict[tuple[Pair, bool], WarmSimulation] = {}
+
+
+def warm_simulation(pair: Pair, fresh_world: bool = False) -> WarmSimulation:
+    """The warm containers of pair, started on first use and closed when the process exits."""
+
+    key = (pair, fresh_world)
+
+    if key not in _warm_simulations:
+        simulation = _warm_simulations[key] = WarmSimulation(pair, fresh_world)
+        # Unlike atexit, this also runs when a multiprocessing worker exits.
+        multiprocessing.util.Finalize(simulation, simulation.close, exitpriority=10)
+
+    return _warm_simulations[key]
+
+
+@dataclasses.dataclass(frozen=True)
+class Cpv1Model:
+    """Evaluates one cpv1 sample. A module-level class so staliro can pickle it into its workers."""
+
+    requirement: str
+    early_stop: bool = dataclasses.field(default=True)
+    warm: bool = dataclasses.field(default=False)
+    fresh_world: bool = dataclasses.field(default=False)
+    backend: str = dataclasses.field(default="gazebo")
+
+    def simulate(self, on_chunk: Callable[[messages.Chunk], bool | None] | None = None) -> messages.Result:
+        # Every process runs its own pair, so concurrent samples never share a world or partition.
+        pair = Pair.of_process()
+
+        if self.warm:
+            return warm_simulation(pair, self.fresh_world).run(on_chunk)
+
+        return run_simulation(on_chunk, pair)
+
+    def __call__(self, sample: staliro.Sample) -> staliro.Trace[dict[str, float]]:
+        online = monitor.online_monitor(self.requirement) if self.early_stop else None
+
+        if self.backend != "gazebo":
+            sim_result = messages.Result(
+                kinematic.run(messages.Start(commands=itertools.repeat(None), magnet=None), backend=self.backend)
+            )
+        elif online is None:
+            sim_result = self.simulate()
+        else:
+            sim_result = self.simulate(lambda chunk: online.update(chunk.trace) is monitor.Verdict.FALSIFIED)
+
+        return staliro.Trace(sim_result.history.to_dict())
 
 
 @click.group()
@@ -97,31 +428,30 @@ def test():
 
 
 @test.command()
-def cpv1():
-    @staliro.models.model()
-    def model(sample: staliro.Sample) -> staliro.Trace[dict[str, float]]:
-        sim_result = run_simulation()
-        trace = {
-            step.time: {
-                "x": step.position[0],
-                "y": step.position[1],
-                "z": step.position[2],
-                "theta": step.heading,
-                "omega": step.roll,
-            }
-            for step in sim_result.history
-        }
-
-        return staliro.Trace(trace)
-
-
-    spec = staliro.specifications.rtamt.parse_dense("always (x > 0)")  # Use reference trajectory to assert error never exceeds given bound
+@click.option("--early-stop/--no-early-stop", default=True, help="Stop each simulation once the specification is falsified.")
+@click.option("-j", "--workers", type=click.IntRange(min=1), default=1, help="Number of simulations to run in parallel.")
+@click.option("--warm", is_flag=True, help="Reuse running containers between samples, moving the rover back to its spawn pose.")
+@click.option("--fresh-world", is_flag=True, help="With --warm, respawn the rover in a reset world between samples instead.")
+@click.option(
+    "--backend",
+    type=click.Choice(["gazebo", *kinematic.BACKENDS]),
+    default="gazebo",
+    help="Simulate in Gazebo containers or with an in-process kinematic model for quick screening.",
+)
+def cpv1(early_stop: bool, workers: int, warm: bool, fresh_world: bool, backend: str):
+    requirement = "always (x > 0)"  # Use reference trajectory to assert error never exceeds given bound
+    model = staliro.models.model()(Cpv1Model(requirement, early_stop, warm, fresh_world, backend))
+    spec = staliro.specifications.rtamt.parse_dense(requirement)
     opt = staliro.optimizers.UniformRandom() # TODO: replace with SOAR
+    # staliro evaluates samples in worker processes, each running its own container pair.
+    parallel = {"parallelization": workers} if workers > 1 else {}
     opts = staliro.TestOptions(
         runs=1,
         iterations=100,
         signals={},
+        **parallel,
     )
+
     test_result = staliro.test(model, spec, opt, opts)
 
     # TODO: do something with the result
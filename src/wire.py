@@ -0,0 +1,248 @@
+"""Binary multipart encoding of the messages exchanged between the test driver and publishers.
+
+Every message starts with a fixed-size header frame. A result trace is sent as one additional frame
+per column holding the raw bytes of its ``array`` buffer, so sending it involves no per-step
+serialisation and the frames are handed to zmq without copying. Messages without a native encoding
+fall back to a pickle frame.
+"""
+
+from __future__ import annotations
+
+import enum
+import pickle
+import struct
+import sys
+import typing
+from array import array
+from collections.abc import Sequence
+from pathlib import Path
+
+import attack
+import messages
+
+if typing.TYPE_CHECKING:
+    import zmq
+
+MAGIC: typing.Final[bytes] = b"SWAB"
+VERSION: typing.Final[int] = 1
+
+# magic, version, kind, byte order (0 little / 1 big), flags, length
+HEADER = struct.Struct("<4sBBBBQ")
+MAGNET = struct.Struct("<d")
+OFFSET = struct.Struct("<Q")
+
+_LITTLE = 0 if sys.byteorder == "little" else 1
+_HAS_MAGNET = 0x01
+_FINAL = 0x02
+_NO_COMMAND = 0
+
+Frame: typing.TypeAlias = "bytes | memoryview"
+
+
+class Kind(enum.IntEnum):
+    PICKLE = 0
+    START = 1
+    RESULT = 2
+    ERROR = 3
+    CHUNK = 4
+    ABORT = 5
+
+
+class WireError(Exception):
+    pass
+
+
+class RemoteError(Exception):
+    """An exception raised on the other end of the socket."""
+
+
+def _header(kind: Kind, length: int, flags: int = 0) -> bytes:
+    return HEADER.pack(MAGIC, VERSION, kind, _LITTLE, flags, length)
+
+
+def _encode_start(msg: messages.Start) -> list[Frame] | None:
+    commands = msg.commands
+    magnet = msg.magnet
+
+    if not isinstance(commands, Sequence):
+        return None
+
+    if magnet is not None and type(magnet) is not attack.StationaryMagnet:
+        return None
+
+    codes = array("B", (_NO_COMMAND if cmd is None else cmd for cmd in commands))
+
+    if magnet is None:
+        return [_header(Kind.START, len(codes)), memoryview(codes)]
+
+    return [_header(Kind.START, len(codes), _HAS_MAGNET), memoryview(codes), MAGNET.pack(magnet.magnitude)]
+
+
+def _encode_result(msg: messages.Result) -> list[Frame]:
+    trace = msg.history
+    columns = [memoryview(trace.columns[name]) for name in messages.Trace.FLOAT_COLUMNS]
+
+    return [_header(Kind.RESULT, len(trace)), *columns, memoryview(trace.states)]
+
+
+def encode_chunk(trace: messages.Trace, start: int, stop: int, *, final: bool = False) -> list[Frame]:
+    """Encode rows [start, stop) of a trace that is still being appended to.
+
+    The rows are copied out so the trace can keep growing while the frames sit in the send queue.
+    """
+
+    views = trace.view(start, stop)
+
+    try:
+        columns = [views[name].tobytes() for name in messages.Trace.FLOAT_COLUMNS]
+        states = views["state"].tobytes()
+    finally:
+        for view in views.values():
+            view.release()
+
+    return [_header(Kind.CHUNK, stop - start, _FINAL if final else 0), OFFSET.pack(start), *columns, states]
+
+
+def encode(msg: object) -> list[Frame]:
+    """Encode a message into frames, using pickle only for messages without a native encoding."""
+
+    if isinstance(msg, messages.Result):
+        return _encode_result(msg)
+
+    if isinstance(msg, messages.Start):
+        frames = _encode_start(msg)
+
+        if frames is not None:
+            return frames
+
+    if isinstance(msg, messages.Abort):
+        return [_header(Kind.ABORT, 0)]
+
+    if isinstance(msg, Exception):
+        text = f"{type(msg).__name__}: {msg}".encode()
+        return [_header(Kind.ERROR, len(text)), text]
+
+    return [_header(Kind.PICKLE, 0), pickle.dumps(msg, protocol=pickle.HIGHEST_PROTOCOL)]
+
+
+def _column(typecode: str, frame: Frame, length: int, swap: bool) -> array:
+    column = array(typecode)
+    column.frombytes(frame)
+
+    if len(column) != length:
+        raise WireError(f"Expected column of {length} values, received {len(column)}")
+
+    if swap:
+        column.byteswap()
+
+    return column
+
+
+def decode(frames: Sequence[Frame | zmq.Frame]) -> object:
+    """Decode frames produced by ``encode``. Error messages decode to ``RemoteError`` instances."""
+
+    if not frames:
+        raise WireError("Received empty message")
+
+    views = [memoryview(frame) for frame in frames]
+
+    if len(views[0]) != HEADER.size:
+        raise WireError("Missing message header")
+
+    magic, version, kind, order, flags, length = HEADER.unpack(views[0])
+
+    if magic != MAGIC:
+        raise WireError("Unrecognized message header")
+
+    if version != VERSION:
+        raise WireError(f"Unsupported protocol version {version}")
+
+    swap = order != _LITTLE
+
+    if kind == Kind.RESULT:
+        names = messages.Trace.FLOAT_COLUMNS
+
+        if len(views) != len(names) + 2:
+            raise WireError(f"Expected {len(names) + 2} frames for a result, received {len(views)}")
+
+        columns = {name: _column("d", view, length, swap) for name, view in zip(names, views[1:])}
+        states = _column("B", views[-1], length, False)
+
+        return messages.Result(messages.Trace(columns, states))
+
+    if kind == Kind.CHUNK:
+        names = messages.Trace.FLOAT_COLUMNS
+
+        if len(views) != len(names) + 3:
+            raise WireError(f"Expected {len(names) + 3} frames for a chunk, received {len(views)}")
+
+        (offset,) = OFFSET.unpack(views[1])
+        columns = {name: _column("d", view, length, swap) for name, view in zip(names, views[2:])}
+        states = _column("B", views[-1], length, False)
+
+        return messages.Chunk(offset, messages.Trace(columns, states), bool(flags & _FINAL))
+
+    if kind == Kind.START:
+        codes = _column("B", views[1], length, False)
+        commands = [None if code == _NO_COMMAND else code for code in codes]
+        magnet = None
+
+        if flags & _HAS_MAGNET:
+            (magnitude,) = MAGNET.unpack(views[2])
+            magnet = attack.StationaryMagnet(magnitude)
+
+        return messages.Start(commands=commands, magnet=magnet)
+
+    if kind == Kind.ABORT:
+        return messages.Abort()
+
+    if kind == Kind.ERROR:
+        return RemoteError(views[1].tobytes().decode())
+
+    if kind == Kind.PICKLE:
+        return pickle.loads(views[1])
+
+    raise WireError(f"Unknown message kind {kind}")
+
+
+class TraceStreamer:
+    """Streams the rows of a growing trace in batches over a PUSH socket."""
+
+    def __init__(self, sock: zmq.Socket, batch: int = 1):
+        if batch < 1:
+            raise ValueError("Stream batch size must be at least 1")
+
+        self._sock = sock
+        self._batch = batch
+        self._sent = 0
+
+    def push(self, trace: messages.Trace, *, final: bool = False):
+        """Send the rows appended since the last chunk once a full batch is available."""
+
+        stop = len(trace)
+
+        if final or stop - self._sent >= self._batch:
+            self._sock.send_multipart(encode_chunk(trace, self._sent, stop, final=final))
+            self._sent = stop
+
+    def close(self, trace: messages.Trace):
+        """Send the remaining rows, marking the end of the stream."""
+
+        self.push(trace, final=True)
+
+    def reset(self):
+        """Start over for the trace of the next simulation."""
+
+        self._sent = 0
+
+
+def address(path: Path) -> str:
+    return f"ipc://{path}"
+
+
+def send(sock: zmq.Socket, msg: object):
+    sock.send_multipart(encode(msg), copy=False)
+
+
+def recv(sock: zmq.Socket) -> object:
+    return decode(sock.recv_multipart(copy=False))
@@ -3,8 +3,16 @@
 export GZ_SIM_RESOURCE_PATH=/app/resources/models
 FIRMWARE=$1
 CPV=$2 # the gdb script for a particular CPV
-
-COMM1="gz sim -s -r -v4 default.sdf"
+MODE=${3:-realtime} # realtime, or lockstep to let the gdb script step the world
+
+if [ "$MODE" = "lockstep" ]; then
+	# Gazebo starts paused; the gdb script advances it once per firmware loop.
+	COMM1="gz sim -s -v4 default.sdf"
+	export SWAB_LOCKSTEP=1
+else
+	COMM1="gz sim -s -r -v4 default.sdf"
+	export SWAB_LOCKSTEP=0
+fi
 COMM2="sleep 8 && firmware && gz topic -e -t /world/default/pose/info"
 #COMM3="qemu-system-arm -machine lm3s6965evb -cpu cortex-m4 -nographic -kernel $FIRMWARE -D /user/data/new_qemu.log.1 -d int,cpu_reset,guest_errors,unimp -gdb tcp::1234 -S"
 ## COMM4="gdb -q $FIRMWARE"
@@ -12,10 +20,14 @@ COMM2="sleep 8 && firmware && gz topic -e -t /world/default/pose/info"
 
 $COMM1 2>/dev/null &
 
-sleep 8 && firmware
+# Wait for the world, the rover and qemu's gdb stub instead of sleeping a fixed time.
+until gz service -l | grep -q /world/default/create; do sleep 0.2; done
+firmware
+until gz model --list 2>/dev/null | grep -q r1_rover; do sleep 0.2; done
 
 qemu-system-arm -machine lm3s6965evb -cpu cortex-m4 -nographic -kernel $FIRMWARE -D /user/data/new_qemu.log.1 -d int,cpu_reset,guest_errors,unimp -gdb tcp::1234 -S &
 
-sleep 8 && gdb -nw -q -x $CPV $FIRMWARE
+until (exec 3<>/dev/tcp/localhost/1234) 2>/dev/null; do sleep 0.2; done
+gdb -nw -q -x $CPV $FIRMWARE
 
 